@@ -0,0 +1,105 @@
+"""
+Load test for the asyncio render pool.
+
+Fires many concurrent render requests at a :class:`jts_erd.aio.RenderPool`
+while a heartbeat coroutine measures how long the event loop is blocked,
+and reports the sustained throughput and latencies.
+
+Usage: python async_load.py [REQUESTS [CONCURRENCY [MODE [WORKERS]]]]
+with MODE being 'subprocess' (needs the graphviz `dot` executable)
+or 'process' (needs pygraphviz).
+"""
+
+import asyncio
+import sys
+import time
+sys.path.append('..')
+
+from jts_erd.aio import RenderPool
+
+
+default_database = {
+    'database_name': 'loadtest',
+    'generation_begin_time': '2015-10-18 13:30:20.086386+02',
+    'datapackages': [{
+        'datapackage': 'public',
+        'resources': [
+            {'name': 'channel',
+             'fields': [{'name': 'id', 'type': 'int4'},
+                        {'name': 'channel_type', 'type': 'chan'}],
+             'primaryKey': ['id']},
+            {'name': 'person',
+             'fields': [{'name': 'id', 'type': 'int4'},
+                        {'name': 'name', 'type': 'varchar(100)'},
+                        {'name': 'channel_id', 'type': 'int4'}],
+             'primaryKey': ['id'],
+             'foreignKeys': [{'fields': ['channel_id'],
+                              'reference': {'datapackage': 'public',
+                                            'resource': 'channel',
+                                            'fields': ['id'],
+                                            'cardinalitySelf': '0..N',
+                                            'cardinalityRef': '1'}}]},
+        ],
+    }],
+}
+
+
+async def heartbeat(interval, max_delays):
+    """
+    Record the maximal delay of a periodic timer until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        max_delays.append(loop.time() - start - interval)
+
+
+async def request(pool, latencies):
+    """
+    Render the test database and record the latency.
+    """
+    start = time.perf_counter()
+    svg = await pool.render(default_database, timeout=60)
+    assert svg.startswith(b'<?xml')
+    latencies.append(time.perf_counter() - start)
+
+
+async def main(requests=200, concurrency=50, mode='subprocess',
+               workers=None):
+    """
+    Run *requests* renders with at most *concurrency* in flight.
+    """
+    max_delays = []
+    latencies = []
+    async with RenderPool(workers=workers, queue_size=concurrency,
+                          mode=mode) as pool:
+        beat = asyncio.ensure_future(heartbeat(0.01, max_delays))
+        start = time.perf_counter()
+        in_flight = set()
+        for _ in range(requests):
+            if len(in_flight) >= concurrency:
+                _, in_flight = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight.add(asyncio.ensure_future(request(pool, latencies)))
+        await asyncio.gather(*in_flight)
+        duration = time.perf_counter() - start
+        beat.cancel()
+    latencies.sort()
+    print('mode %s, %s workers, %s requests, concurrency %s'
+          % (mode, pool.workers, requests, concurrency))
+    print('throughput       %8.1f renders/s' % (requests / duration))
+    print('latency median   %8.1f ms' % (latencies[len(latencies) // 2] * 1000))
+    print('latency p95      %8.1f ms'
+          % (latencies[int(len(latencies) * 0.95)] * 1000))
+    print('max loop delay   %8.1f ms' % (max(max_delays) * 1000))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    asyncio.run(main(
+        requests=int(args[0]) if len(args) > 0 else 200,
+        concurrency=int(args[1]) if len(args) > 1 else 50,
+        mode=args[2] if len(args) > 2 else 'subprocess',
+        workers=int(args[3]) if len(args) > 3 else None,
+    ))
@@ -0,0 +1,104 @@
+"""
+Benchmark the unique constraint lookup in the column display.
+
+Compares building the "combined" cells of all columns of a synthetic
+table with 500 columns and 100 composite unique constraints, once with
+a linear scan over all unique constraints per column (the former
+implementation, reproduced here as :func:`get_uniques_linear`) and once
+using the inverted index from :func:`jts_erd.model._get_unique_index`.
+"""
+
+import random
+import sys
+import timeit
+sys.path.append('..')
+
+from jts_erd.jts_erd import _get_column_display
+from jts_erd.model import _get_table, _get_unique_index
+
+
+def get_table(columns=500, uniques=100, max_unique_fields=20, seed=0):
+    """
+    Return a synthetic table with *columns* columns and *uniques* constraints.
+
+    Each unique constraint comprises between 2 and *max_unique_fields*
+    randomly chosen columns.
+    """
+    rnd = random.Random(seed)
+    fields = [{'name': 'column_%s' % i,
+               'type': 'int4',
+               'constraints': {'required': bool(i % 2)}}
+              for i in range(columns)]
+    column_names = [f['name'] for f in fields]
+    unique = [{'fields': rnd.sample(column_names,
+                                    rnd.randint(2, max_unique_fields))}
+              for _ in range(uniques)]
+    return {'name': 'wide_table', 'fields': fields, 'unique': unique}
+
+
+def get_uniques_linear(table, column):
+    """
+    Return the unique markers of a *column* scanning all constraints.
+    """
+    uniques = []
+    for t_u_i, t_u in enumerate(table.get('unique') or []):
+        if column['name'] in t_u['fields']:
+            i = t_u['fields'].index(column['name'])
+            if len(t_u['fields']) == 1:
+                uniques.append('UNIQ')
+            else:
+                uniques.append('UNIQ%s:%s' % (str(t_u_i + 1), str(i + 1)))
+    return uniques
+
+
+def render_linear(table):
+    """
+    Compute the unique markers of all columns with the linear scan.
+    """
+    for column in table['fields']:
+        get_uniques_linear(table, column)
+
+
+def render_indexed(table):
+    """
+    Compute the unique markers of all columns with the inverted index.
+    """
+    unique_index = _get_unique_index([u['fields'] for u in table['unique']])
+    for column in table['fields']:
+        unique_index.get(column['name'], [])
+
+
+def render_display(table):
+    """
+    Compute the complete column display of all columns of *table*.
+    """
+    model_table = _get_table('public', table)
+    display = ['name', 'type', 'combined']
+    for column in model_table.columns:
+        _get_column_display(display, model_table, column)
+
+
+def main(repeat=5, number=10):
+    """
+    Run the benchmark and print the best timings per table render.
+    """
+    table = get_table()
+    for column in table['fields']:
+        expected = get_uniques_linear(table, column)
+        unique_index = _get_unique_index([u['fields']
+                                          for u in table['unique']])
+        actual = ['UNIQ' if n == 1 else 'UNIQ%s:%s' % (nr, i)
+                  for nr, i, n in unique_index.get(column['name'], [])]
+        assert expected == actual, column['name']
+    print('table with %s columns and %s unique constraints'
+          % (len(table['fields']), len(table['unique'])))
+    for name, func in (('linear scan', render_linear),
+                       ('inverted index', render_indexed),
+                       ('full column display', render_display)):
+        best = min(timeit.repeat(lambda: func(table),
+                                 repeat=repeat, number=number)) / number
+        print('%-20s %8.3f ms' % (name, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
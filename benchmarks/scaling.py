@@ -0,0 +1,181 @@
+"""
+Benchmark how rendering scales with the schema size.
+
+For synthetic schemas (cf. :mod:`synthetic`) of increasing size the
+phases :func:`jts_erd.get_graph`, layout and drawing (SVG) are timed
+separately. Each run is appended as one JSON line to a results file
+together with the current git commit, and compared with the previous
+run with the same parameters, so regressions between commits show up.
+
+Usage: python scaling.py [--sizes 10 100 1000 10000] [--layout-limit N]
+see ``python scaling.py --help``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+sys.path.append('..')
+
+from jts_erd import get_graph
+from synthetic import get_schema
+
+
+phases = ('get_graph', 'layout', 'draw')
+
+regression_threshold = 1.2
+"""
+Timing ratio (current / previous) reported as a regression.
+"""
+
+
+def run(sizes, repeat=1, layout_limit=1000, prog='dot', namespaces=1,
+        fk_density=1.0, multi_column_fk_share=0.1, **options):
+    """
+    Time the phases for schemas with the given numbers of tables.
+
+    Layout and drawing are skipped (timed as None) for schemas with more
+    than *layout_limit* tables. The best of *repeat* runs is taken.
+    Return a list of dicts, one per size.
+    """
+    results = []
+    for size in sizes:
+        schema = get_schema(size, namespaces=namespaces,
+                            fk_density=fk_density,
+                            multi_column_fk_share=multi_column_fk_share)
+        timings = {phase: None for phase in phases}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            schema_graph = get_graph(schema, **options)
+            timings['get_graph'] = _best(timings['get_graph'],
+                                         time.perf_counter() - start)
+            if size > layout_limit:
+                continue
+            start = time.perf_counter()
+            schema_graph.layout(prog=prog)
+            timings['layout'] = _best(timings['layout'],
+                                      time.perf_counter() - start)
+            start = time.perf_counter()
+            svg = schema_graph.draw(format='svg')
+            timings['draw'] = _best(timings['draw'],
+                                    time.perf_counter() - start)
+        results.append({
+            'tables': size,
+            'nodes': schema_graph.number_of_nodes(),
+            'edges': schema_graph.number_of_edges(),
+            'svg_bytes': len(svg) if size <= layout_limit else None,
+            'timings': timings,
+        })
+        print(_format_result(results[-1]), flush=True)
+    return results
+
+
+def compare(results, previous):
+    """
+    Print the timing ratios of *results* against *previous* results.
+
+    Return the number of regressions.
+    """
+    previous_by_size = {result['tables']: result for result in previous}
+    regressions = 0
+    for result in results:
+        old = previous_by_size.get(result['tables'])
+        if old is None:
+            continue
+        ratios = []
+        for phase in phases:
+            new_time = result['timings'][phase]
+            old_time = old['timings'][phase]
+            if new_time is None or not old_time:
+                ratios.append('%-18s' % '')
+                continue
+            ratio = new_time / old_time
+            marker = ''
+            if ratio > regression_threshold:
+                marker = ' !'
+                regressions += 1
+            ratios.append('%-18s' % ('%s %.2fx%s' % (phase, ratio, marker)))
+        print('%6s tables: %s' % (result['tables'], ''.join(ratios).rstrip()))
+    return regressions
+
+
+def _best(best, value):
+    return value if best is None else min(best, value)
+
+
+def _format_result(result):
+    timings = ''.join('%-18s' % ('%s %s' % (
+        phase, '-' if result['timings'][phase] is None
+        else '%.3fs' % result['timings'][phase])) for phase in phases)
+    return '%6s tables %6s nodes %6s edges: %s' % (
+        result['tables'], result['nodes'], result['edges'], timings.rstrip())
+
+
+def _get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_previous(results_path, parameters):
+    """
+    Return the results of the last run with the same *parameters*.
+    """
+    previous = None
+    if os.path.exists(results_path):
+        with open(results_path, encoding='utf-8') as results_file:
+            for line in results_file:
+                run_ = json.loads(line)
+                if run_['parameters'] == parameters:
+                    previous = run_
+    return previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 30, 100, 300, 1000, 3000, 10000])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--layout-limit', type=int, default=1000,
+                        help='largest schema (tables) to lay out and draw')
+    parser.add_argument('--prog', default='dot', help='layout engine')
+    parser.add_argument('--namespaces', type=int, default=1)
+    parser.add_argument('--fk-density', type=float, default=1.0)
+    parser.add_argument('--multi-column-fk-share', type=float, default=0.1)
+    parser.add_argument('--results', default='results.jsonl',
+                        help='file with the results of all runs')
+    args = parser.parse_args(argv)
+    parameters = {name: getattr(args, name) for name in (
+        'sizes', 'repeat', 'layout_limit', 'prog', 'namespaces',
+        'fk_density', 'multi_column_fk_share')}
+    previous = _load_previous(args.results, parameters)
+    results = run(args.sizes, repeat=args.repeat,
+                  layout_limit=args.layout_limit, prog=args.prog,
+                  namespaces=args.namespaces, fk_density=args.fk_density,
+                  multi_column_fk_share=args.multi_column_fk_share)
+    run_ = {
+        'commit': _get_commit(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'parameters': parameters,
+        'results': results,
+    }
+    with open(args.results, 'a', encoding='utf-8') as results_file:
+        results_file.write(json.dumps(run_) + '\n')
+    if previous:
+        print('compared with commit %s (%s):'
+              % (previous['commit'], previous['time']))
+        return compare(results, previous['results'])
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
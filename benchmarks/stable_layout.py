@@ -0,0 +1,86 @@
+"""
+Benchmark stable re-layouts against full layouts.
+
+For synthetic schemas (cf. :mod:`synthetic`) of the given sizes a
+positions file is written by a first render; then the table referenced
+by the most foreign keys gets another column, and the changed schema is
+rendered once with a full layout and once reusing the stored positions
+(cf. :func:`jts_erd.positions.layout_stable`). The total times include
+building the graph and drawing the SVG (which with pygraphviz runs
+`neato -n2` once more); the layout times are those of the 'layout'
+phase (cf. :class:`jts_erd.stats.RenderStats`).
+
+Usage: python stable_layout.py [TABLES ...]
+(default: 80 300 1000)
+"""
+
+import collections
+import copy
+import os
+import sys
+import tempfile
+import time
+sys.path.append('..')
+
+from jts_erd import render
+from jts_erd.stats import RenderStats
+from synthetic import get_schema
+
+
+def get_changed_schema(schema):
+    """
+    Return a copy of *schema* where the most referenced table has a new column.
+    """
+    schema = copy.deepcopy(schema)
+    references = collections.Counter()
+    tables = {}
+    for datapackage in schema['datapackages']:
+        for table in datapackage['resources']:
+            key = (datapackage['datapackage'], table['name'])
+            tables[key] = table
+            for foreign_key in table.get('foreignKeys', []):
+                reference = foreign_key['reference']
+                references[(reference['datapackage'],
+                            reference['resource'])] += 1
+    key = references.most_common(1)[0][0]
+    tables[key]['fields'].append({'name': 'new_column', 'type': 'int4'})
+    return schema
+
+
+def run(tables):
+    """
+    Return the times (seconds) of a full and a stable re-layout.
+
+    Return two pairs (total, layout): the first for the full layout,
+    the second for the stable one.
+    """
+    schema = get_schema(tables)
+    changed_schema = get_changed_schema(schema)
+    with tempfile.TemporaryDirectory() as directory:
+        svg_path = os.path.join(directory, 'erd.svg')
+        positions = os.path.join(directory, 'erd.positions.json')
+        render(schema, [svg_path], positions=positions)
+        timings = []
+        for kwargs in ({}, {'positions': positions}):
+            stats = RenderStats()
+            start = time.perf_counter()
+            render(changed_schema, [svg_path], stats=stats, **kwargs)
+            timings.append((time.perf_counter() - start,
+                            stats.phases['layout']['wall']))
+    return timings
+
+
+def main(argv=None):
+    sizes = [int(arg) for arg in (argv or sys.argv[1:])] or [80, 300, 1000]
+    print('%6s %25s %25s' % ('', 'total', 'layout'))
+    print('%6s %25s %25s' % ('tables', 'full / stable / speedup',
+                             'full / stable / speedup'))
+    for tables in sizes:
+        (full, full_layout), (stable, stable_layout) = run(tables)
+        print('%6d %7.2fs %7.2fs %7.1fx %7.2fs %7.2fs %7.1fx'
+              % (tables, full, stable, full / stable, full_layout,
+                 stable_layout, full_layout / stable_layout), flush=True)
+
+
+if __name__ == '__main__':
+    main()
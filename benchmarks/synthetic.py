@@ -0,0 +1,152 @@
+"""
+Generator for synthetic JSON database schemas in the shape of pg_jts.
+
+:func:`get_schema` returns a reproducible (seeded) random schema; its
+size and structure are controlled by the number of tables and namespaces,
+columns per table, foreign key density, the share of multi-column
+foreign keys, unique constraints and indexes.
+
+Usage: python synthetic.py TABLES [OUTPUT_FILE]
+writes a schema with default parameters as JSON (default: to stdout).
+"""
+
+import json
+import random
+import sys
+
+
+column_types = ('int4', 'int8', 'text', 'varchar(100)', 'bool', 'date',
+                'timestamptz', 'numeric(10,2)', 'jsonb', 'uuid')
+
+
+def get_schema(tables=100, namespaces=1, columns=(3, 15), fk_density=1.0,
+               multi_column_fk_share=0.1, unique=0.3, indexes=1.0,
+               seed=0):
+    """
+    Return a synthetic JSON database schema.
+
+    *tables* is the total number of tables, distributed round robin over
+    *namespaces* namespaces (the first one is 'public'). Each table has
+    a random number of columns in the closed range *columns* (min, max),
+    including an 'id' primary key column. *fk_density* is the mean
+    number of foreign keys per table; *multi_column_fk_share* is the
+    share of them referencing two columns. *unique* and *indexes* are
+    the mean numbers of unique constraints and of extra (non-unique)
+    indexes per table.
+    """
+    rnd = random.Random(seed)
+    namespace_names = ['public'] + ['ns%s' % i for i in range(1, namespaces)]
+    datapackages = [{'datapackage': name, 'resources': []}
+                    for name in namespace_names]
+    all_tables = []
+    for i in range(tables):
+        datapackage = datapackages[i % namespaces]
+        table = _get_table(rnd, 'table_%s' % i, columns, unique, indexes)
+        datapackage['resources'].append(table)
+        all_tables.append((datapackage['datapackage'], table))
+    for _, table in all_tables:
+        foreign_keys = []
+        if len(table['fields']) < 2:  # no column for a foreign key
+            continue
+        for _ in range(_get_count(rnd, fk_density)):
+            head_namespace, head = rnd.choice(all_tables)
+            multi = (rnd.random() < multi_column_fk_share and
+                     len(table['fields']) > 2 and len(head['fields']) > 2)
+            foreign_keys.append(_get_foreign_key(rnd, table, head_namespace,
+                                                 head, multi))
+        table['foreignKeys'] = foreign_keys
+    return {
+        'database_name': 'synthetic',
+        'database_description': 'synthetic schema (seed %s)' % seed,
+        'generation_begin_time': '2015-10-18 13:30:20.086386+02',
+        'generation_end_time': '2015-10-18 13:30:20.086386+02',
+        'source': 'PostgreSQL',
+        'source_version': '9.4.4',
+        'datapackages': datapackages,
+    }
+
+
+def _get_count(rnd, mean):
+    """
+    Return a random non-negative integer with expectation *mean*.
+    """
+    count = int(mean)
+    if rnd.random() < mean - count:
+        count += 1
+    return count
+
+
+def _get_table(rnd, name, columns, unique, indexes):
+    fields = [{'name': 'id', 'type': 'int4',
+               'constraints': {'required': True},
+               'default_value': "nextval('%s_id_seq'::regclass)" % name}]
+    for i in range(1, rnd.randint(*columns)):
+        field = {'name': 'column_%s' % i,
+                 'type': rnd.choice(column_types),
+                 'constraints': {'required': rnd.random() < 0.5}}
+        if rnd.random() < 0.2:
+            field['description'] = 'Description of %s.column_%s' % (name, i)
+        fields.append(field)
+    column_names = [field['name'] for field in fields[1:]]
+    table = {
+        'name': name,
+        'fields': fields,
+        'primaryKey': ['id'],
+        'indexes': [_get_index(name, ['id'], unique=True, primary=True)],
+    }
+    if rnd.random() < 0.3:
+        table['description'] = 'Description of table %s' % name
+    uniques = []
+    for _ in range(_get_count(rnd, unique) if column_names else 0):
+        unique_fields = rnd.sample(column_names,
+                                   min(len(column_names), rnd.randint(1, 3)))
+        uniques.append({'fields': unique_fields,
+                        'name': '%s__unique_%s' % (name, len(uniques))})
+        table['indexes'].append(_get_index(name, unique_fields, unique=True))
+    if uniques:
+        table['unique'] = uniques
+    for _ in range(_get_count(rnd, indexes) if column_names else 0):
+        index_fields = rnd.sample(column_names,
+                                  min(len(column_names), rnd.randint(1, 2)))
+        table['indexes'].append(_get_index(name, index_fields))
+    return table
+
+
+def _get_index(table_name, fields, unique=False, primary=False):
+    name = '%s__%s' % (table_name, '_'.join(fields))
+    definition = 'btree (%s)' % ', '.join(fields)
+    return {
+        'name': name,
+        'fields': fields,
+        'unique': unique,
+        'primary': primary,
+        'definition': definition,
+        'creation': 'CREATE %sINDEX %s ON %s USING %s' % (
+            'UNIQUE ' if unique else '', name, table_name, definition),
+    }
+
+
+def _get_foreign_key(rnd, table, head_namespace, head, multi):
+    head_columns = ['id']
+    if multi:
+        head_columns.append(rnd.choice(head['fields'][1:])['name'])
+    columns = rnd.sample([field['name'] for field in table['fields'][1:]],
+                         len(head_columns))
+    reference = {'datapackage': head_namespace,
+                 'resource': head['name'],
+                 'fields': head_columns,
+                 'name': '%s_%s_fkey' % (table['name'], '_'.join(columns))}
+    if rnd.random() < 0.3:
+        reference['cardinalitySelf'] = rnd.choice(['0..N', '1..N'])
+        reference['cardinalityRef'] = rnd.choice(['0..1', '1'])
+    return {'fields': columns, 'enforced': rnd.random() < 0.9,
+            'reference': reference}
+
+
+if __name__ == '__main__':
+    schema = get_schema(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], 'w', encoding='utf-8') as schema_file:
+            json.dump(schema, schema_file, indent=1)
+    else:
+        json.dump(schema, sys.stdout, indent=1)
@@ -0,0 +1,35 @@
+"""
+Benchmark the preflight validation of large schemas.
+
+Times :func:`jts_erd.validate.validate` on synthetic schemas (cf.
+synthetic.py) of growing size and compares it to building the model
+with :func:`jts_erd.model.get_model`, which is needed for rendering
+anyway.
+"""
+
+import sys
+import timeit
+sys.path.append('..')
+
+from jts_erd.model import get_model
+from jts_erd.validate import validate
+from synthetic import get_schema
+
+
+def main(sizes=(1000, 10000), repeat=5):
+    """
+    Run the benchmark and print the best timings per schema.
+    """
+    print('%8s %14s %14s' % ('tables', 'validate [ms]', 'model [ms]'))
+    for size in sizes:
+        schema = get_schema(tables=size, namespaces=10)
+        assert validate(schema) == []
+        times = []
+        for func in (validate, get_model):
+            times.append(min(timeit.repeat(lambda: func(schema),
+                                           repeat=repeat, number=1)))
+        print('%8s %14.1f %14.1f' % (size, times[0] * 1000, times[1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -18,10 +18,12 @@ jts_erd creates an ERD (entity-relationship diagram).
 
 It requires an extension of a json-table-schema as input.
 
-Depends on pygraphviz.
+Depends on pygraphviz, or (with backend 'dot') on the graphviz executables.
 """
 
-from .jts_erd import get_graph, save_svg
+from .jts_erd import (get_graph, render, render_bytes, save_svg,
+                      update_graph)
+from .model import get_model
 
 __version__ = (0, 0, 1)
 
@@ -0,0 +1,213 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Asyncio API for rendering ERDs without blocking the event loop.
+
+A :class:`RenderPool` bounds the number of concurrently running renders
+(*workers*) and of renders waiting for a worker (*queue_size*). When the
+queue is full, :meth:`RenderPool.render` waits for a free slot (or, with
+*wait=False*, raises :class:`QueueFull`), which propagates backpressure
+to the callers.
+
+The pool has two modes:
+
+  * **subprocess** (default): the graph is built with the pure-Python
+    DOT backend (:mod:`jts_erd.dot`) in a thread and rendered by a `dot`
+    subprocess, which is killed when the render is cancelled or times out.
+  * **process**: graphs are built, laid out and drawn with pygraphviz in a
+    pool of worker processes, each running one render at a time.
+    Cancelling or timing out only abandons the result of a render that
+    has already started.
+
+In neither mode are pygraphviz (cgraph) operations run in the event
+loop's process: :func:`get_graph_async` returns graphs of the pure-Python
+DOT backend, which are laid out and drawn by graphviz subprocesses.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+from . import dot
+from .jts_erd import get_graph
+
+
+cgraph_lock = threading.Lock()
+"""
+Lock to hold for all pygraphviz operations run in threads of a process.
+
+cgraph is not thread-safe; e.g. :mod:`jts_erd.server` holds it while
+building, laying out and drawing a graph.
+"""
+
+
+class QueueFull(Exception):
+    """
+    Raised if a render is requested without waiting and the queue is full.
+    """
+
+
+class RenderPool(object):
+    """
+    A bounded pool rendering ERDs for coroutines.
+
+    *workers* renders run concurrently (default: number of CPUs) and up to
+    *queue_size* further renders wait for a worker. *mode* is
+    'subprocess' or 'process' (see :mod:`jts_erd.aio`); *prog* is the
+    graphviz layout program.
+
+    The pool must be created and used within one event loop; close it with
+    :meth:`close` (or use it as an asynchronous context manager).
+    """
+
+    def __init__(self, workers=None, queue_size=100, mode='subprocess',
+                 prog='dot'):
+        if mode not in ('subprocess', 'process'):
+            raise ValueError('Unknown mode %s' % mode)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.mode = mode
+        self.prog = prog
+        self._workers = asyncio.Semaphore(self.workers)
+        self._slots = asyncio.Semaphore(self.workers + queue_size)
+        self._executor = None
+        if mode == 'process':
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.workers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """
+        Shut down the worker processes (in mode 'process').
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, json_database_schema, format='svg', timeout=None,
+                     wait=True, **options):
+        """
+        Render an ERD for *json_database_schema* and return it as bytes.
+
+        *format* is a graphviz output format. If *timeout* (seconds,
+        including the time spent waiting in the queue) expires, raise
+        :class:`asyncio.TimeoutError`. If *wait* is false and the queue
+        is full, raise :class:`QueueFull` instead of waiting.
+        All keys from :any:`jts_erd.jts_erd.options_defaults` are allowed
+        in *options*.
+        """
+        coroutine = self._render(json_database_schema, format, wait, options)
+        if timeout is None:
+            return await coroutine
+        return await asyncio.wait_for(coroutine, timeout)
+
+    async def _render(self, json_database_schema, format, wait, options):
+        if not wait and self._slots.locked():
+            raise QueueFull()
+        async with self._slots:
+            async with self._workers:
+                if self.mode == 'process':
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(
+                        self._executor, _render_pygraphviz,
+                        json_database_schema, format, self.prog, options)
+                return await self._render_subprocess(json_database_schema,
+                                                     format, options)
+
+    async def _render_subprocess(self, json_database_schema, format,
+                                 options):
+        """
+        Build the DOT text in a thread and render it with a subprocess.
+        """
+        dot_string = await asyncio.to_thread(_get_dot_string,
+                                             json_database_schema, options)
+        prog = self.prog
+        if dot.graphviz_bin_dir:
+            prog = os.path.join(dot.graphviz_bin_dir, prog)
+        process = await asyncio.create_subprocess_exec(
+            prog, '-T' + format,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await process.communicate(
+                dot_string.encode('utf-8'))
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        if process.returncode:
+            raise ValueError('Graphviz raised an error: %s'
+                             % stderr.decode('utf-8', 'replace'))
+        return stdout
+
+
+async def get_graph_async(json_database_schema, **options):
+    """
+    Like :func:`jts_erd.get_graph`, but build the graph in a thread.
+
+    The graph is always a :class:`jts_erd.dot.DotGraph` (backend 'dot'),
+    so that no cgraph operations run in the event loop's process; its
+    :meth:`jts_erd.dot.DotGraph.layout` and
+    :meth:`jts_erd.dot.DotGraph.draw` run graphviz subprocesses (which
+    block, so call them in a thread, too). Raise a ValueError if another
+    backend is requested.
+    """
+    backend = options.pop('backend', 'dot')
+    if backend != 'dot':
+        raise ValueError('get_graph_async only supports backend dot, not %s'
+                         % backend)
+    return await asyncio.to_thread(get_graph, json_database_schema,
+                                   backend='dot', **options)
+
+
+async def save_svg_async(json_database_schema, filepath, pool, timeout=None,
+                         **options):
+    """
+    Like :func:`jts_erd.save_svg`, but render with a :class:`RenderPool`.
+
+    *filepath* must end in '.svg'; *timeout* is passed on to
+    :meth:`RenderPool.render`.
+    """
+    svg = await pool.render(json_database_schema, format='svg',
+                            timeout=timeout, **options)
+    await asyncio.to_thread(_write_file, filepath, svg)
+
+
+def _get_dot_string(json_database_schema, options):
+    options = dict(options, backend='dot')
+    return get_graph(json_database_schema, **options).to_string()
+
+
+def _render_pygraphviz(json_database_schema, format, prog, options):
+    """
+    Render an ERD with pygraphviz (in a worker process).
+    """
+    schema_graph = get_graph(json_database_schema, **options)
+    schema_graph.layout(prog=prog)
+    return schema_graph.draw(format=format)
+
+
+def _write_file(filepath, data):
+    with open(filepath, 'wb') as f:
+        f.write(data)
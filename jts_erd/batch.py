@@ -0,0 +1,279 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Batch rendering of many JSON database schema files.
+
+:func:`render_batch` renders SVG ERDs for many schema files (as written
+by pg_jts) on a pool of worker processes. The most expensive schemas
+are started first: their cost is taken from the render durations of
+previous runs, recorded in a small JSON metadata file, or else
+estimated from the numbers of tables and foreign keys (cf.
+:func:`_get_schedule`). A failing schema is reported and does
+not abort the batch; invalid schemas are rejected before the layout
+(cf. :func:`jts_erd.validate.check`).
+
+The options are merged once for the whole batch; each worker process
+keeps one :class:`jts_erd.cache.LabelCache` for all schemas it renders
+and all workers share an optional :class:`jts_erd.cache.RenderCache`.
+
+Run as a command with ``python -m jts_erd.batch --help``.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import os
+import statistics
+import time
+import traceback
+
+from .cache import LabelCache, RenderCache
+from .jts_erd import _get_options, options_defaults, save_svg
+from .validate import check
+
+
+_worker_label_cache = None
+"""
+The label cache of a worker process (set by :func:`_init_worker`).
+"""
+
+
+def render_batch(schema_paths, output_dir, processes=None,
+                 metadata_path=None, cache=None, **options):
+    """
+    Render an SVG ERD for each file in *schema_paths* into *output_dir*.
+
+    The output file name is the schema file name with extension '.svg';
+    raise a ValueError if two schema files would have the same output
+    file. Up to *processes* worker processes are used (default: number
+    of CPUs).
+    If *metadata_path* is given, render durations are read from and
+    written to this JSON file. *cache* is an optional
+    :class:`jts_erd.cache.RenderCache`. All keys from
+    :any:`jts_erd.jts_erd.options_defaults` are allowed in *options*.
+
+    Return a list of dicts (in the order of *schema_paths*) with keys
+    'schema_path', 'output_path', 'duration' (seconds), 'tables',
+    'foreign_keys' and 'error' (a traceback string, or None).
+    """
+    opt = _get_options(options)
+    output_paths = _get_output_paths(schema_paths, output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    metadata = _load_metadata(metadata_path)
+    order = _get_schedule(schema_paths, metadata)
+    results = [None] * len(schema_paths)
+    with concurrent.futures.ProcessPoolExecutor(
+            processes, initializer=_init_worker) as executor:
+        futures = {}
+        for i in order:
+            future = executor.submit(_render_one, schema_paths[i],
+                                     output_paths[i], cache, opt)
+            futures[future] = i
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception:  # e.g. a crashed worker process
+                results[i] = {'schema_path': schema_paths[i],
+                              'output_path': None, 'duration': None,
+                              'tables': None, 'foreign_keys': None,
+                              'error': traceback.format_exc()}
+    for result in results:
+        if result['error'] is None:
+            metadata[os.path.abspath(result['schema_path'])] = {
+                'duration': result['duration'],
+                'size': os.path.getsize(result['schema_path']),
+                'tables': result['tables'],
+                'foreign_keys': result['foreign_keys'],
+            }
+    if metadata_path:
+        _save_metadata(metadata_path, metadata)
+    return results
+
+
+def _get_output_paths(schema_paths, output_dir):
+    """
+    Return the output paths for *schema_paths*; raise a ValueError on clashes.
+    """
+    output_paths = []
+    schema_path_by_output_path = {}
+    for schema_path in schema_paths:
+        output_path = os.path.join(
+            output_dir,
+            os.path.splitext(os.path.basename(schema_path))[0] + '.svg')
+        other_path = schema_path_by_output_path.setdefault(output_path,
+                                                           schema_path)
+        if other_path != schema_path:
+            raise ValueError('%s and %s would both be rendered to %s'
+                             % (other_path, schema_path, output_path))
+        output_paths.append(output_path)
+    return output_paths
+
+
+def _get_schedule(schema_paths, metadata):
+    """
+    Return the indexes of *schema_paths*, most expensive schema first.
+
+    The cost of a schema file whose size is unchanged since it was
+    recorded in *metadata* is its recorded duration. Other costs are
+    estimated from the number of tables and foreign keys, at the median
+    duration per table or foreign key of the recorded schemas. For a
+    changed file this number is the recorded one scaled by the change
+    in size; for a file without record it is estimated from the file
+    size, at the median number per byte of the recorded schemas.
+    """
+    recorded = [entry for entry in metadata.values()
+                if entry.get('size') and entry.get('tables') is not None]
+    rate = density = 1.0
+    if recorded:
+        rate = statistics.median(entry['duration'] / _get_elements(entry)
+                                 for entry in recorded)
+        density = statistics.median(_get_elements(entry) / entry['size']
+                                    for entry in recorded)
+    costs = []
+    for schema_path in schema_paths:
+        try:
+            size = os.path.getsize(schema_path)
+        except OSError:
+            costs.append(0)
+            continue
+        entry = metadata.get(os.path.abspath(schema_path))
+        if entry and entry.get('size') == size:
+            costs.append(entry['duration'])
+        elif (entry and entry.get('size') and
+                entry.get('tables') is not None):
+            costs.append(rate * _get_elements(entry) * size / entry['size'])
+        else:
+            costs.append(rate * density * size)
+    return sorted(range(len(schema_paths)), key=lambda i: -costs[i])
+
+
+def _get_elements(entry):
+    """
+    Return the number of tables and foreign keys of a metadata *entry*.
+    """
+    return max(entry['tables'] + entry['foreign_keys'], 1)
+
+
+def _init_worker():
+    global _worker_label_cache
+    _worker_label_cache = LabelCache()
+
+
+def _render_one(schema_path, output_path, cache, opt):
+    """
+    Render one schema file (in a worker process) and return its result.
+    """
+    result = {'schema_path': schema_path, 'output_path': output_path,
+              'duration': None, 'tables': None, 'foreign_keys': None,
+              'error': None}
+    start = time.perf_counter()
+    try:
+        with open(schema_path, encoding='utf-8') as schema_file:
+            json_database_schema = json.load(schema_file)
+        namespaces = json_database_schema['datapackages']
+        result['tables'] = sum(len(namespace['resources'])
+                               for namespace in namespaces)
+        result['foreign_keys'] = sum(len(table.get('foreignKeys', []))
+                                     for namespace in namespaces
+                                     for table in namespace['resources'])
+        check(json_database_schema)
+        save_svg(json_database_schema, output_path, cache=cache,
+                 label_cache=_worker_label_cache, **opt)
+    except Exception:
+        result['output_path'] = None
+        result['error'] = traceback.format_exc()
+    result['duration'] = time.perf_counter() - start
+    return result
+
+
+def _load_metadata(metadata_path):
+    if metadata_path and os.path.exists(metadata_path):
+        with open(metadata_path, encoding='utf-8') as metadata_file:
+            return json.load(metadata_file)
+    return {}
+
+
+def _save_metadata(metadata_path, metadata):
+    tmp_path = '%s.%s.tmp' % (metadata_path, os.getpid())
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as metadata_file:
+            json.dump(metadata, metadata_file, indent=1, sort_keys=True)
+        os.replace(tmp_path, metadata_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def main(argv=None):
+    """
+    Command line interface for :func:`render_batch`.
+
+    Return the exit status: 1 if any schema failed, else 0.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m jts_erd.batch',
+        description='Render ERDs for many JSON database schema files.')
+    parser.add_argument('schema_paths', nargs='+', metavar='SCHEMA',
+                        help='JSON database schema file')
+    parser.add_argument('-o', '--output-dir', required=True,
+                        help='directory for the SVG files')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--metadata',
+                        help='JSON file recording render durations')
+    parser.add_argument('--cache-dir', help='render cache directory')
+    parser.add_argument('--option', action='append', default=[],
+                        metavar='KEY=JSON_VALUE',
+                        help='option from options_defaults, e.g.'
+                             ' rankdir=\\"RL\\" or display_columns=false')
+    args = parser.parse_args(argv)
+    options = {}
+    for option in args.option:
+        key, _, value = option.partition('=')
+        if key not in options_defaults:
+            parser.error('unknown option %s' % key)
+        options[key] = json.loads(value)
+    cache = RenderCache(args.cache_dir) if args.cache_dir else None
+    try:
+        _get_output_paths(args.schema_paths, args.output_dir)
+    except ValueError as exc:
+        parser.error(str(exc))
+    results = render_batch(args.schema_paths, args.output_dir,
+                           processes=args.processes,
+                           metadata_path=args.metadata, cache=cache,
+                           **options)
+    failures = 0
+    for result in sorted(results, key=lambda r: -(r['duration'] or 0)):
+        if result['error']:
+            failures += 1
+            print('FAILED %8.2fs  %s\n%s' % (result['duration'] or 0,
+                                            result['schema_path'],
+                                            result['error']))
+        else:
+            print('ok     %8.2fs  %s (%s tables, %s foreign keys)'
+                  % (result['duration'], result['schema_path'],
+                     result['tables'], result['foreign_keys']))
+    if failures:
+        print('%s of %s schemas failed' % (failures, len(results)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
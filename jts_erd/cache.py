@@ -0,0 +1,313 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Caches for rendered ERDs and for table node labels.
+
+A :class:`RenderCache` stores rendered output files in a directory,
+addressed by a hash over the JSON database schema and the effective
+options. Pass it to :func:`jts_erd.save_svg` as *cache* to skip
+building, laying out and drawing the graph for unchanged schemas.
+
+A :class:`LabelCache` holds the HTML labels of table nodes, addressed
+by a fingerprint of the table and the options the label depends on.
+Pass it to :func:`jts_erd.get_graph` (or :func:`jts_erd.save_svg`)
+as *label_cache* to regenerate only the labels of changed tables.
+
+Multiple processes may share one cache directory: entries are written
+to a temporary file and atomically renamed into place, and eviction
+is serialized with a lock file (on platforms providing :mod:`fcntl`).
+"""
+
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from .model import json_default
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+cache_format_version = 2
+"""
+Version of the cache key computation; bump it whenever the rendered
+output for a given schema and options changes.
+"""
+
+
+def get_cache_key(json_database_schema, opt, fmt='svg', prog='dot', args=''):
+    """
+    Return a hex digest identifying a rendering of a schema.
+
+    *opt* must contain the effective options (i.e., with all defaults
+    from :any:`jts_erd.jts_erd.options_defaults` merged in), *fmt*
+    is the output format and *prog* and *args* are the layout engine
+    and its arguments. *json_database_schema* may also be a
+    :class:`jts_erd.model.Schema`.
+    """
+    canonical = json.dumps(
+        [cache_format_version, fmt, prog, args, opt, json_database_schema],
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+        default=json_default
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class RenderCache(object):
+    """
+    A directory holding rendered output files, evicted in LRU order.
+
+    *directory* is created if it does not exist. If *max_size* (bytes)
+    is given, the least recently used entries are removed once the
+    total size of all entries exceeds it. If *max_age* (seconds) is
+    given, entries not used for longer than that are removed.
+    If *link* is true, cache hits are hard-linked to the target path
+    instead of being copied (falling back to copying if linking fails);
+    the target file then must not be modified in place.
+    """
+
+    suffix = '.entry'
+
+    def __init__(self, directory, max_size=None, max_age=None, link=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.link = link
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key, filepath):
+        """
+        Write the cache entry for *key* to *filepath*.
+
+        Return True on a cache hit and False if there is no such entry.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            self._materialize(entry_path, filepath)
+        except FileNotFoundError:
+            return False
+        with contextlib.suppress(OSError):
+            os.utime(entry_path)
+        return True
+
+    def put(self, key, filepath):
+        """
+        Store a copy of file *filepath* as the cache entry for *key*.
+
+        Afterwards evict entries as required by *max_size* and *max_age*.
+        """
+        tmp_path = _get_tmp_path(self._entry_path(key))
+        try:
+            shutil.copyfile(filepath, tmp_path)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Remove entries exceeding *max_age* or (oldest first) *max_size*.
+        """
+        if self.max_size is None and self.max_age is None:
+            return
+        with self._lock():
+            entries = []
+            for dir_entry in os.scandir(self.directory):
+                if not dir_entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+            entries.sort()
+            total_size = sum(size for _, size, _ in entries)
+            now = time.time()
+            for mtime, size, path in entries:
+                too_old = (self.max_age is not None and
+                           now - mtime > self.max_age)
+                too_big = (self.max_size is not None and
+                           total_size > self.max_size)
+                if not too_old and not too_big:
+                    break
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+                total_size -= size
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock():
+            for dir_entry in os.scandir(self.directory):
+                if dir_entry.name.endswith(self.suffix):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(dir_entry.path)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        Hold an exclusive lock on the cache directory (if supported).
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _materialize(self, entry_path, filepath):
+        """
+        Atomically replace *filepath* with a copy or link of *entry_path*.
+        """
+        tmp_path = _get_tmp_path(filepath)
+        try:
+            linked = False
+            if self.link:
+                try:
+                    os.link(entry_path, tmp_path)
+                    linked = True
+                except FileNotFoundError:
+                    raise
+                except OSError:
+                    pass
+            if not linked:
+                shutil.copyfile(entry_path, tmp_path)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+
+class LabelCache(object):
+    """
+    A mapping from table fingerprints to table node labels.
+
+    The cache lives in memory and can be reused across calls of
+    :func:`jts_erd.get_graph`. If *filepath* is given, entries are
+    loaded from that file (if it exists) and :meth:`save` writes
+    them back to it. If *max_entries* is given, the least recently used
+    entries are dropped once there are more entries than that.
+
+    :attr:`hits` and :attr:`misses` count the lookups.
+    """
+
+    def __init__(self, filepath=None, max_entries=None):
+        self.filepath = filepath
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._labels = collections.OrderedDict()
+        self._used = set()
+        if filepath and os.path.exists(filepath):
+            with open(filepath, encoding='utf-8') as label_file:
+                self._labels.update(json.load(label_file))
+            self._evict()
+
+    def __len__(self):
+        return len(self._labels)
+
+    def get(self, fingerprint):
+        """
+        Return the label for *fingerprint*, or None if it is not cached.
+        """
+        label = self._labels.get(fingerprint)
+        if label is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._used.add(fingerprint)
+            if self.max_entries is not None:
+                with contextlib.suppress(KeyError):  # evicted meanwhile
+                    self._labels.move_to_end(fingerprint)
+        return label
+
+    def put(self, fingerprint, label):
+        """
+        Store *label* for *fingerprint*.
+        """
+        self._labels[fingerprint] = label
+        self._used.add(fingerprint)
+        self._evict()
+
+    def stats(self):
+        """
+        Return a dict with the numbers of hits, misses and entries.
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._labels)}
+
+    def save(self, filepath=None, prune=False):
+        """
+        Atomically write all entries to *filepath* (default: the
+        *filepath* given on construction).
+
+        If *prune* is true, only entries looked up or stored since
+        construction are kept (others are also dropped from memory).
+        """
+        filepath = filepath or self.filepath
+        if prune:
+            self._labels = collections.OrderedDict(
+                (fingerprint, label)
+                for fingerprint, label in self._labels.items()
+                if fingerprint in self._used)
+        tmp_path = _get_tmp_path(filepath)
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as label_file:
+                json.dump(self._labels, label_file, ensure_ascii=False)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def _evict(self):
+        """
+        Drop the least recently used entries exceeding *max_entries*.
+        """
+        if self.max_entries is None:
+            return
+        while len(self._labels) > self.max_entries:
+            try:
+                fingerprint, _ = self._labels.popitem(last=False)
+            except KeyError:  # emptied by another thread
+                break
+            self._used.discard(fingerprint)
+
+
+def _get_tmp_path(path):
+    """
+    Return a unique temporary path in the same directory as *path*.
+    """
+    return '%s.%s.tmp' % (path, uuid.uuid4().hex)
@@ -0,0 +1,270 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The command line tool ``jts-erd``.
+
+It reads a JSON database schema from a file or stdin and writes an ERD
+to a file or stdout; all keys of :any:`jts_erd.jts_erd.options_defaults`
+are available as flags, e.g. ``--rankdir RL --no-display-indexes``.
+
+With ``--watch`` the schema file is polled and the ERD is re-rendered
+whenever it changes (cf. :func:`watch`). The graph, the model of the
+last schema and a :class:`jts_erd.cache.LabelCache` are kept in memory,
+so only the changed tables are rebuilt (cf. :func:`jts_erd.update_graph`).
+
+Before rendering, the schema is validated (cf. :func:`jts_erd.validate.check`);
+all problems are reported on stderr.
+
+Run ``jts-erd --help`` (or ``python -m jts_erd.cli --help``) for usage.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from . import stream
+from .cache import LabelCache
+from .jts_erd import (_draw_replacing, _get_format, _option_choices,
+                      _write_data, get_graph, options_defaults,
+                      update_graph)
+from .model import get_model
+from .pack import _edge_position_attrs, _node_position_attrs
+from .stats import RenderStats, measure, phase
+from .validate import SchemaError, check
+
+
+def watch(schema_path, output_path, interval=1.0, prog='dot', args='',
+          backend='pygraphviz', positions=None, label_cache=None,
+          **options):
+    """
+    Render *schema_path* to *output_path* whenever the schema changes.
+
+    The modification time and size of *schema_path* are checked every
+    *interval* seconds. Errors (e.g. a schema file being written) are
+    reported on stderr and the next change is awaited. The other
+    arguments are as for :func:`jts_erd.render`. Return on
+    KeyboardInterrupt.
+    """
+    renderer = _Renderer(output_path, None, prog, args, backend, positions,
+                         label_cache, None, options)
+    last_state = None
+    try:
+        while True:
+            try:
+                stat = os.stat(schema_path)
+                state = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                state = None
+            if state is not None and state != last_state:
+                last_state = state
+                start = time.perf_counter()
+                try:
+                    with open(schema_path, encoding='utf-8') as schema_file:
+                        renderer.render(stream.load(schema_file))
+                except (OSError, ValueError, KeyError) as exc:
+                    print('%s: %s: %s' % (schema_path, type(exc).__name__,
+                                          exc), file=sys.stderr)
+                else:
+                    print('%s written in %.2fs'
+                          % (output_path, time.perf_counter() - start),
+                          file=sys.stderr)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+class _Renderer(object):
+    """
+    Render successive versions of a schema, keeping the graph in between.
+
+    *output_path* is a file path or '-' for stdout (in format *fmt*).
+    """
+
+    def __init__(self, output_path, fmt, prog, args, backend, positions,
+                 label_cache, stats, options):
+        self.output_path = output_path
+        self.fmt = fmt
+        self.prog = prog
+        self.args = args
+        self.backend = backend
+        self.positions = positions
+        if label_cache is None:
+            label_cache = LabelCache()
+        self.label_cache = label_cache
+        self.stats = stats
+        self.options = options
+        self.model = None
+        self.schema_graph = None
+
+    def render(self, json_database_schema):
+        """
+        Render *json_database_schema* (update the graph if there is one).
+        """
+        with measure(self.stats):
+            self._render(json_database_schema)
+
+    def _render(self, json_database_schema):
+        with phase(self.stats, 'model'):
+            for warning in check(json_database_schema):
+                print(warning, file=sys.stderr)
+            model = get_model(json_database_schema)
+        try:
+            if self.schema_graph is None:
+                self.schema_graph = get_graph(
+                    model, label_cache=self.label_cache,
+                    backend=self.backend, stats=self.stats, **self.options)
+            else:
+                update_graph(self.schema_graph, self.model, model,
+                             label_cache=self.label_cache, **self.options)
+                _clear_layout(self.schema_graph)
+            self.model = model
+            with phase(self.stats, 'layout'):
+                if self.positions:
+                    from .positions import layout_stable
+                    layout_stable(self.schema_graph, self.positions,
+                                  prog=self.prog, args=self.args)
+                else:
+                    self.schema_graph.layout(prog=self.prog, args=self.args)
+            with phase(self.stats, 'draw'):
+                self._write()
+        except BaseException:
+            # the graph may be partially updated
+            self.model = self.schema_graph = None
+            raise
+
+    def _write(self):
+        if self.output_path == '-':
+            fmt = self.fmt or 'svg'
+            data = self.schema_graph.draw(
+                format='svg' if fmt == 'svgz' else fmt)
+            _write_data(data, sys.stdout.buffer, fmt == 'svgz')
+            return
+        _draw_replacing(self.schema_graph, self.output_path)
+
+
+def _clear_layout(schema_graph):
+    """
+    Remove the attributes set by a previous layout from *schema_graph*.
+
+    Otherwise the sizes of the nodes would be kept as minimal sizes.
+    """
+    for node in schema_graph.nodes():
+        for name in _node_position_attrs:
+            if node.attr.get(name):
+                node.attr[name] = ''
+    for edge in schema_graph.edges():
+        for name in _edge_position_attrs:
+            if edge.attr.get(name):
+                edge.attr[name] = ''
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        prog='jts-erd',
+        description='Render an ERD for a JSON database schema.')
+    parser.add_argument('schema', nargs='?', default='-',
+                        help='JSON database schema file (default: stdin)')
+    parser.add_argument('-o', '--output', default='-',
+                        help='output file; its extension gives the format'
+                             ' (default: stdout)')
+    parser.add_argument('-T', '--format',
+                        help='output format for stdout (default: svg)')
+    parser.add_argument('--prog', default='dot',
+                        help='graphviz layout engine (default: dot)')
+    parser.add_argument('--args', default='',
+                        help='further arguments for the layout engine,'
+                             ' e.g. --args=-Gnodesep=0.5')
+    parser.add_argument('--backend', default='pygraphviz',
+                        choices=('pygraphviz', 'dot'))
+    parser.add_argument('--positions', metavar='FILE',
+                        help='reuse node positions stored in FILE')
+    parser.add_argument('--label-cache', metavar='FILE',
+                        help='keep table labels in FILE between runs')
+    parser.add_argument('--stats', action='store_true',
+                        help='print timings and sizes to stderr')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='re-render whenever the schema file changes')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between checks in watch mode')
+    group = parser.add_argument_group(
+        'diagram options', 'options from jts_erd.options_defaults')
+    for key, default in options_defaults.items():
+        kwargs = {'dest': key, 'default': argparse.SUPPRESS,
+                  'help': 'default: %s' % default}
+        if isinstance(default, bool):
+            kwargs['action'] = argparse.BooleanOptionalAction
+        elif key in _option_choices:
+            kwargs['choices'] = _option_choices[key]
+        elif default is None:  # max_columns
+            kwargs['type'] = _non_negative_int
+        else:
+            kwargs['type'] = type(default)
+        group.add_argument('--' + key.replace('_', '-'), **kwargs)
+    return parser
+
+
+def _non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError('%s is negative' % value)
+    return number
+
+
+def main(argv=None):
+    """
+    Command line interface; return the exit status.
+    """
+    parser = _get_parser()
+    args = parser.parse_args(argv)
+    options = {key: getattr(args, key) for key in options_defaults
+               if hasattr(args, key)}
+    if args.output != '-':
+        try:
+            _get_format(args.output)
+        except ValueError as exc:
+            parser.error(str(exc))
+    label_cache = LabelCache(args.label_cache)
+    if args.watch:
+        if args.schema == '-' or args.output == '-':
+            parser.error('--watch needs a schema file and an output file')
+        watch(args.schema, args.output, interval=args.interval,
+              prog=args.prog, args=args.args, backend=args.backend,
+              positions=args.positions, label_cache=label_cache, **options)
+    else:
+        stats = RenderStats() if args.stats else None
+        if args.schema == '-':
+            json_database_schema = stream.load(sys.stdin)
+        else:
+            with open(args.schema, encoding='utf-8') as schema_file:
+                json_database_schema = stream.load(schema_file)
+        renderer = _Renderer(args.output, args.format, args.prog, args.args,
+                             args.backend, args.positions, label_cache,
+                             stats, options)
+        try:
+            renderer.render(json_database_schema)
+        except SchemaError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        if stats is not None:
+            print(stats, file=sys.stderr)
+    if args.label_cache:
+        label_cache.save(prune=True)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,280 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Pure-Python DOT writer, used as an alternative to pygraphviz.
+
+:class:`DotGraph` implements the part of the pygraphviz AGraph API
+which jts_erd uses for building graphs. It writes the graph in the DOT
+language and renders it by piping the DOT text to a graphviz layout
+executable (such as `dot`) in a subprocess; thus it needs neither
+pygraphviz nor a compiler toolchain, only an installed graphviz.
+
+Use it by passing *backend='dot'* to :func:`jts_erd.get_graph` or
+:func:`jts_erd.save_svg`.
+"""
+
+import os
+import re
+import shlex
+import subprocess
+
+
+graphviz_bin_dir = None
+"""
+Directory containing the graphviz executables; if None, they are
+searched for in the PATH.
+"""
+
+_quote_pattern = re.compile(r'(\\*)("|\Z)')
+"""
+Backslashes before a double quote or at the end of a quoted DOT ID.
+"""
+
+
+class DotGraph(object):
+    """
+    A directed multigraph with attributes, serializable to DOT.
+
+    *name* is the graph name and *attrs* are graph attributes; like with
+    pygraphviz, default node and edge attributes can be set in the dicts
+    *node_attr* and *edge_attr*.
+    """
+
+    def __init__(self, strict=False, directed=True, name='', **attrs):
+        self.strict = strict
+        self.directed = directed
+        self.name = name
+        self.graph_attr = dict(attrs)
+        self.node_attr = {}  # default node attributes
+        self.edge_attr = {}  # default edge attributes
+        self._nodes = {}  # maps node names to attributes
+        self._edges = []  # [tail, head, attributes] triples
+        self._layout = None  # laid out DOT (bytes)
+
+    def __str__(self):
+        return self.to_string()
+
+    def add_node(self, name, **attrs):
+        """
+        Add a node, or update the attributes of an existing node.
+        """
+        self._nodes.setdefault(name, {}).update(attrs)
+
+    def has_node(self, name):
+        return name in self._nodes
+
+    def get_node(self, name):
+        """
+        Return the node *name*; its attributes are in its *attr* dict.
+        """
+        if name not in self._nodes:
+            raise KeyError('Node %s not in graph.' % name)
+        return _Node(name, self._nodes[name])
+
+    def delete_node(self, name):
+        """
+        Remove node *name* and all edges incident to it.
+        """
+        if name not in self._nodes:
+            raise KeyError('Node %s not in graph.' % name)
+        del self._nodes[name]
+        self._edges = [edge for edge in self._edges
+                       if name not in (edge[0], edge[1])]
+
+    def nodes(self):
+        return [_Node(name, attrs) for name, attrs in self._nodes.items()]
+
+    def add_edge(self, tail, head, **attrs):
+        """
+        Add an edge from *tail* to *head*, adding missing nodes.
+        """
+        self._nodes.setdefault(tail, {})
+        self._nodes.setdefault(head, {})
+        self._edges.append([tail, head, attrs])
+
+    def has_edge(self, tail, head):
+        return any(edge[0] == tail and edge[1] == head
+                   for edge in self._edges)
+
+    def delete_edge(self, tail, head):
+        """
+        Remove one edge from *tail* to *head*.
+        """
+        for i, edge in enumerate(self._edges):
+            if edge[0] == tail and edge[1] == head:
+                del self._edges[i]
+                return
+        raise KeyError('Edge %s-%s not in graph.' % (tail, head))
+
+    def edges(self):
+        return [_Edge(tail, head, attrs) for tail, head, attrs
+                in self._edges]
+
+    def number_of_nodes(self):
+        return len(self._nodes)
+
+    def number_of_edges(self):
+        return len(self._edges)
+
+    def to_string(self):
+        """
+        Return the graph in the DOT language.
+        """
+        lines = ['%s%s %s {' % ('strict ' if self.strict else '',
+                                'digraph' if self.directed else 'graph',
+                                _quote(self.name))]
+        if self.graph_attr:
+            lines.append('\tgraph [%s];' % _format_attrs(self.graph_attr))
+        if self.node_attr:
+            lines.append('\tnode [%s];' % _format_attrs(self.node_attr))
+        if self.edge_attr:
+            lines.append('\tedge [%s];' % _format_attrs(self.edge_attr))
+        for name, attrs in self._nodes.items():
+            if attrs:
+                lines.append('\t%s\t[%s];' % (_quote(name),
+                                              _format_attrs(attrs)))
+            else:
+                lines.append('\t%s;' % _quote(name))
+        edge_op = '->' if self.directed else '--'
+        for tail, head, attrs in self._edges:
+            attrs = dict(attrs)
+            tail_port = attrs.pop('tailport', '')
+            head_port = attrs.pop('headport', '')
+            line = '\t%s%s %s %s%s' % (
+                _quote(tail), ':' + _quote(tail_port) if tail_port else '',
+                edge_op,
+                _quote(head), ':' + _quote(head_port) if head_port else '')
+            if attrs:
+                line += '\t[%s]' % _format_attrs(attrs)
+            lines.append(line + ';')
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    string = to_string
+
+    def close(self):
+        """
+        Release the nodes, edges and layout (like AGraph.close).
+        """
+        self._nodes = {}
+        self._edges = []
+        self._layout = None
+
+    def layout(self, prog='dot', args=''):
+        """
+        Lay out the graph by running the graphviz program *prog*.
+
+        *args* are further command line arguments. The result (DOT with
+        positions) is kept for :meth:`draw`.
+        """
+        self._layout = _run([prog, '-Tdot'] + shlex.split(args),
+                            self.to_string().encode('utf-8'))
+
+    @property
+    def has_layout(self):
+        return self._layout is not None
+
+    def draw(self, path=None, format=None, prog=None, args=''):
+        """
+        Render the graph to file *path*, or return the output as bytes.
+
+        *format* defaults to the extension of *path*. If *prog* is given,
+        the graph is laid out with it (and *args*); otherwise the layout
+        computed by :meth:`layout` is drawn (with `neato -n2`).
+        """
+        if format is None and path is not None:
+            format = os.path.splitext(path)[1].lower()[1:]
+        format = format or 'dot'
+        if prog is not None:
+            args = [prog] + shlex.split(args)
+            dot_input = self.to_string().encode('utf-8')
+        elif self._layout is not None:
+            args = ['neato', '-n2'] + shlex.split(args)
+            dot_input = self._layout
+        else:
+            raise AttributeError('Graph has no layout information, see'
+                                 ' layout() or specify prog.')
+        args.append('-T' + format)
+        if path is not None:
+            args.extend(['-o', path])
+        output = _run(args, dot_input)
+        if path is None:
+            return output
+
+
+class _Node(str):
+    """
+    A node name with an *attr* dict, like a pygraphviz Node.
+    """
+
+    def __new__(cls, name, attrs):
+        node = str.__new__(cls, name)
+        node.attr = attrs
+        return node
+
+
+class _Edge(tuple):
+    """
+    A (tail, head) pair with an *attr* dict, like a pygraphviz Edge.
+    """
+
+    def __new__(cls, tail, head, attrs):
+        edge = tuple.__new__(cls, (tail, head))
+        edge.attr = attrs
+        return edge
+
+
+def _quote(value):
+    """
+    Return *value* as a DOT ID: HTML strings as is, others quoted.
+
+    Backslashes are kept for escape sequences like '\\n'. An odd number
+    of backslashes before a double quote or at the end would escape the
+    (closing) quote, so another backslash is added there.
+    """
+    value = str(value)
+    if value.startswith('<') and value.endswith('>'):
+        return value
+    return '"%s"' % _quote_pattern.sub(_escape_quote, value)
+
+
+def _escape_quote(match):
+    backslashes, quote = match.groups()
+    if len(backslashes) % 2:
+        backslashes += '\\'
+    return backslashes + ('\\"' if quote else '')
+
+
+def _format_attrs(attrs):
+    return ', '.join('%s=%s' % (name, _quote(value))
+                     for name, value in attrs.items())
+
+
+def _run(args, dot_input):
+    """
+    Run a graphviz program with *args*, piping in *dot_input* (bytes).
+
+    Return the output (bytes); raise a ValueError on errors.
+    """
+    if graphviz_bin_dir:
+        args = [os.path.join(graphviz_bin_dir, args[0])] + args[1:]
+    process = subprocess.run(args, input=dot_input,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+    if process.returncode:
+        raise ValueError('Graphviz raised an error: %s'
+                         % process.stderr.decode('utf-8', 'replace'))
+    return process.stdout
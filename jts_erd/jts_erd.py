@@ -28,8 +28,16 @@ of the database schema using `graphviz`_ via `PyGraphviz`_.
 .. _`PyGraphviz`: http://pygraphviz.github.io/
 """
 
-import pygraphviz as pgv
+import contextlib
+import gzip
+import hashlib
+import json
+import os
 import textwrap
+import uuid
+
+from .model import get_model, json_default
+from .stats import measure, phase
 
 
 options_defaults = {
@@ -46,6 +54,11 @@ options_defaults = {
     'display_indexes': True,
     'display_crowfoots': True,
     'omit_isolated_tables': False,
+    'lean': False,
+    'tooltips': True,
+    'detail': 'full',
+    'max_columns': None,
+    'bundle_edges': False,
 }
 """
 Options and their default values.
@@ -66,268 +79,792 @@ Options:
   * **display_indexes**: bool
   * **display_crowfoots**: bool
   * **omit_isolated_tables**: bool  
+  * **lean**: bool; whether to write compact DOT: attributes shared by
+    the nodes and edges are set once as graph-level defaults and the
+    HTML labels contain no whitespace between tags
+  * **tooltips**: bool; whether nodes and edges get tooltips
+  * **detail**: which columns are shown (with option display_columns):
+    'full' (all), 'keys' (only primary key columns and columns taking
+    part in foreign keys) or 'auto' ('full' unless the schema has more
+    than :any:`auto_detail_columns` columns, then 'keys')
+  * **max_columns**: None or the maximum number of columns shown per
+    table with detail 'full' (0: key columns only); key columns are
+    always shown. Hidden columns are summarized in a row '+N more'.
+  * **bundle_edges**: bool; whether foreign keys between the same two
+    tables are drawn as one edge, and multi-column foreign keys without
+    helper nodes (with option display_columns)
+"""
+
+
+auto_detail_columns = 3000
+"""
+Number of columns (of all tables) above which detail 'auto' means 'keys'.
 """
 
+_option_choices = {
+    'rankdir': ('LR', 'RL'),
+    'detail': ('full', 'keys', 'auto'),
+}
+"""
+Allowed values of options with a fixed set of values.
+"""
 
-def get_graph(json_database_schema, **options):
+
+def get_graph(json_database_schema, label_cache=None, backend='pygraphviz',
+              stats=None, **options):
     """
     Create and return a graph from the given *json_database_schema*.
 
+    *json_database_schema* may also be a :class:`jts_erd.model.Schema`
+    (cf. :func:`jts_erd.model.get_model`); building the model once saves
+    time when rendering a schema with different options.
+
     All keys from :any:`options_defaults` are allowed in *kwargs*.
+
+    *backend* is 'pygraphviz' (return a pygraphviz AGraph) or 'dot'
+    (return a :class:`jts_erd.dot.DotGraph`, which does not need
+    pygraphviz and renders using the graphviz executables).
+
+    If a *label_cache* (a :class:`jts_erd.cache.LabelCache`) is given,
+    the HTML labels of table nodes are reused from it where the table
+    and the relevant options are unchanged.
+
+    If *stats* (a :class:`jts_erd.stats.RenderStats`) is given, the
+    phases are timed and the sizes of the graph are recorded in it.
     """
-    opt = options_defaults.copy()
-    opt.update(options)
-    database = json_database_schema['database_name']
-    datetime = json_database_schema['generation_begin_time']
-    namespaces = json_database_schema['datapackages']
-    schema_graph = pgv.AGraph(
+    with measure(stats):
+        return _get_graph(json_database_schema, label_cache, backend, stats,
+                          options)
+
+
+def _get_graph(json_database_schema, label_cache, backend, stats, options):
+    opt = _get_options(options)
+    with phase(stats, 'model'):
+        schema = get_model(json_database_schema)
+    opt['detail'] = _get_detail(opt, schema)
+    schema_graph = _new_graph(
+        backend,
         strict=False,
         directed=True,
-        name='Postgres database %s (as of %s)' % (database, datetime),
+        name='Postgres database %s (as of %s)' % (
+            schema.database_name, schema.generation_begin_time),
         rankdir=opt['rankdir'],
         fontname=opt['fontname'],
         fontsize=opt['fontsize'],
         splines=True,
         overlap='scale'
     )
-
-    # inventory
-    present_tables = {}
-    tables_with_edges = set()  # contains only tables having at least one edge
-    for namespace in namespaces:
-        namespace_name = namespace['datapackage']
-        for table in namespace['resources']:
-            present_tables[(namespace_name, table['name'])] = table
-            if 'foreignKeys' in table:
-                for foreign_key in table['foreignKeys']:
-                    reference = foreign_key['reference']
-                    tables_with_edges.add((namespace_name, table['name']))
-                    tables_with_edges.add((reference['datapackage'],
-                                           reference['resource']))
+    if opt['lean']:
+        schema_graph.node_attr.update(_get_node_defaults(opt))
+        schema_graph.edge_attr.update(_get_edge_defaults(opt))
 
     # add table nodes
-    for namespace in namespaces:
-        namespace_name = namespace['datapackage']
-        for table in namespace['resources']:
-            has_edge = (namespace_name, table['name']) in tables_with_edges
-            if not opt['omit_isolated_tables'] or has_edge:
-                _graph_add_table(opt, schema_graph, namespace_name, table)
+    tables = [table for namespace in schema.namespaces
+              for table in namespace.tables
+              if not opt['omit_isolated_tables'] or
+              table.key in schema.tables_with_edges]
+    with phase(stats, 'labels'):
+        labels = [_get_cached_table_label(opt, table, label_cache=label_cache)
+                  for table in tables]
+    with phase(stats, 'nodes'):
+        for table, label in zip(tables, labels):
+            _graph_add_table(opt, schema_graph, table, label)
 
     # add foreign key edges
-    for namespace in namespaces:
-        namespace_name = namespace['datapackage']
-        table_edges = set()
-        for tail_table in namespace['resources']:
-            tail_table_name = tail_table['name']
-            if 'foreignKeys' in tail_table:
-                for foreign_key in tail_table['foreignKeys']:
-                    columns = foreign_key['fields']
-                    if isinstance(columns, str):
-                        tail_column_names = [columns]
-                    else:
-                        tail_column_names = columns
-                    reference = foreign_key['reference']
-                    head_namespace_name = reference['datapackage']
-                    head_table_name = reference['resource']
-                    head_column_names = reference['fields']
-                    head_table = present_tables[
-                        (head_namespace_name, head_table_name)
-                    ]
-                    enforced = foreign_key.get('enforced', True)
-                    color = 'black' if enforced else 'blue'
-                    card_self = reference.get('cardinalitySelf')
-                    card_ref = reference.get('cardinalityRef')
-                    if card_self or card_ref:
-                        if opt['rankdir'] == 'RL':
-                            label = '%s \u2194 %s' % (card_ref, card_self)
-                        else:
-                            label = '%s \u2194 %s' % (card_self, card_ref)
-                    else:
-                        label = ''
-                    if opt['rankdir'] == 'RL':
-                        tooltip = '%s     %s(%s) \u2194 %s(%s)' % (
-                            label,
-                            head_table_name,
-                            ', '.join(head_column_names),
-                            tail_table_name,
-                            ', '.join(tail_column_names)
-                        )
-                    else:
-                        tooltip = '%s     %s(%s) \u2194 %s(%s)' % (
-                            label,
-                            tail_table_name,
-                            ', '.join(tail_column_names),
-                            head_table_name,
-                            ', '.join(head_column_names)
-                        )
-                    if reference.get('label'):
-                        label += '\n' + reference.get('label')
-                        tooltip += '     ' + reference.get('label')
-                    else:
-                        edge_name = reference.get('name')
-                        if edge_name:
-                            label += '   ' + edge_name
-                            tooltip += '     ' + edge_name
-                    label = label.strip()
-                    tooltip = tooltip.strip()
+    with phase(stats, 'edges'):
+        shown_columns = {}
+        for namespace in schema.namespaces:
+            table_edges = set()
+            foreign_keys = []
+            for tail_table in namespace.tables:
+                for foreign_key in tail_table.foreign_keys:
                     if opt['display_columns']:
-                        _add_foreign_key_edge(
-                            schema_graph,
-                            tail_table_name,
-                            head_table_name,
-                            tail_table,
-                            head_table,
-                            tail_column_names,
-                            head_column_names,
-                            label,
-                            tooltip,
-                            opt,
-                            color,
-                            card_self,
-                            card_ref
-                        )
-                    if not opt['display_columns']:
-                        table_edges.add((tail_table_name, head_table_name))
-        if not opt['display_columns']:
+                        foreign_keys.append(foreign_key)
+                    else:
+                        table_edges.add((tail_table.name,
+                                         foreign_key.head.name))
+            _graph_add_foreign_keys(opt, schema_graph, foreign_keys,
+                                    shown_columns)
             for tail_table_name, head_table_name in table_edges:
                 schema_graph.add_edge(
                     tail_table_name,
                     head_table_name,
-                    color='black'
+                    **_get_edge_attrs(opt, color='black')
                 )
+
+    if stats is not None:
+        nodes = schema_graph.number_of_nodes()
+        stats.counts.update(
+            tables=len(tables),
+            nodes=nodes,
+            helper_nodes=nodes - len(tables),
+            edges=schema_graph.number_of_edges(),
+            label_bytes=sum(len(label.encode('utf-8')) for label in labels)
+        )
     return schema_graph
 
 
-def save_svg(json_database_schema, filepath, **options):
+def update_graph(schema_graph, old_json_database_schema,
+                 json_database_schema, label_cache=None, **options):
+    """
+    Update a graph built from one schema to represent another schema.
+
+    *schema_graph* must have been created by :func:`get_graph` from
+    *old_json_database_schema* with the same *options*; it is modified
+    in place to represent *json_database_schema* and then returned.
+    Both schemas may also be given as :class:`jts_erd.model.Schema`,
+    which is faster when the models are kept between updates.
+
+    Only the delta is applied: table nodes are added, removed or relabeled
+    and the foreign key edges (including the helper nodes of multi-column
+    foreign keys) touching changed tables are replaced. Afterwards the
+    graph has the same nodes and edges (with the same attributes) as
+    a graph freshly built by :func:`get_graph`, though possibly in a
+    different order; the graph name is not changed.
+    """
+    opt = _get_options(options)
+    old_schema = get_model(old_json_database_schema)
+    schema = get_model(json_database_schema)
+    old_opt = dict(opt, detail=_get_detail(opt, old_schema))
+    opt['detail'] = _get_detail(opt, schema)
+    old_tables = old_schema.tables
+    tables = schema.tables
+
+    # tables (identified by their node names) to be updated
+    if old_opt['detail'] != opt['detail']:
+        changed_tables = tables.keys() & old_tables.keys()
+    elif _shows_some_columns(opt):
+        # the shown columns depend on foreign keys of other tables
+        changed_tables = {key for key, table in tables.items()
+                          if key in old_tables and
+                          (old_tables[key] != table or
+                           old_tables[key].referenced_columns !=
+                           table.referenced_columns)}
+    else:
+        changed_tables = {key for key, table in tables.items()
+                          if key in old_tables and old_tables[key] != table}
+    affected_keys = changed_tables | (tables.keys() ^ old_tables.keys())
+    affected_names = {table_name for _, table_name in affected_keys}
+
+    # collect the foreign key edges touching affected tables
+    old_elements = _get_foreign_key_elements(old_opt, old_schema,
+                                             affected_names)
+    elements = _get_foreign_key_elements(opt, schema, affected_names)
+    changed_pairs = {pair for pair in old_elements.edges.keys() |
+                     elements.edges.keys()
+                     if old_elements.edges.get(pair) !=
+                     elements.edges.get(pair)}
+
+    # remove obsolete edges and nodes
+    for tail_node, head_node in changed_pairs:
+        while schema_graph.has_edge(tail_node, head_node):
+            schema_graph.delete_edge(tail_node, head_node)
+    for helper_node in old_elements.nodes.keys() - elements.nodes.keys():
+        schema_graph.delete_node(helper_node)
+    old_shown = {key[1] for key in old_tables
+                 if not opt['omit_isolated_tables'] or
+                 key in old_schema.tables_with_edges}
+    shown = {key[1] for key in tables
+             if not opt['omit_isolated_tables'] or
+             key in schema.tables_with_edges}
+    for table_name in old_shown - shown:
+        schema_graph.delete_node(table_name)
+
+    # add or relabel table nodes, then add helper nodes and edges
+    for key, table in tables.items():
+        if table.name in shown and (table.name not in old_shown or
+                                    key in changed_tables):
+            label = _get_cached_table_label(opt, table,
+                                            label_cache=label_cache)
+            _graph_add_table(opt, schema_graph, table, label)
+    for helper_node, attrs in elements.nodes.items():
+        schema_graph.add_node(helper_node, **attrs)
+    for tail_node, head_node in changed_pairs:
+        for attrs in elements.edges.get((tail_node, head_node), []):
+            schema_graph.add_edge(tail_node, head_node, **attrs)
+    return schema_graph
+
+
+def save_svg(json_database_schema, filepath, cache=None, label_cache=None,
+             backend='pygraphviz', stats=None, **options):
     """
     Write an ERD in SVG format for a database to a file.
 
     *json_database_schema* must be compatible with what pg_jts produces.
     *filepath* must end in '.svg'.
+
+    If *cache* (a :class:`jts_erd.cache.RenderCache`) is given and
+    contains a rendering of the same schema with the same effective
+    options, it is copied to *filepath* without invoking graphviz;
+    otherwise the rendering is stored in the cache.
+    *label_cache*, *backend* and *stats* are passed on to :func:`render`.
+    """
+    render(json_database_schema, [filepath], cache=cache,
+           label_cache=label_cache, backend=backend, stats=stats, **options)
+
+
+def render(json_database_schema, filepaths, prog='dot', args='', cache=None,
+           label_cache=None, backend='pygraphviz', positions=None,
+           stats=None, **options):
+    """
+    Write an ERD for a database to one or more files.
+
+    The graph is laid out once and then drawn to each of the *filepaths*
+    (a single path is accepted, too); the output format is given by the
+    file extension, e.g. 'svg', 'svgz', 'png', 'pdf', 'plain' or 'json'.
+
+    *prog* is the graphviz layout engine ('dot', 'neato', 'fdp', 'sfdp',
+    'twopi', 'circo', ...) and *args* are further command line arguments
+    for it, e.g. '-Gnodesep=0.5'. *cache*, *label_cache* and *backend*
+    are used as in :func:`save_svg`.
+
+    If *positions* (a file path) is given, the node positions of the
+    previous layout are read from and written to this sidecar file and
+    only new and resized tables are placed (cf.
+    :func:`jts_erd.positions.layout_stable`); *cache* must be None then.
+
+    If *stats* (a :class:`jts_erd.stats.RenderStats`) is given, all
+    phases from building the model to drawing are measured in it.
+    """
+    if positions is not None and cache is not None:
+        raise ValueError('Cannot use a cache with stored positions')
+    if isinstance(filepaths, (str, os.PathLike)):
+        filepaths = [filepaths]
+    with measure(stats):
+        _render(json_database_schema, list(filepaths), prog, args, cache,
+                label_cache, backend, positions, stats, options)
+
+
+def _render(json_database_schema, filepaths, prog, args, cache, label_cache,
+            backend, positions, stats, options):
+    keys = {}
+    if cache is not None:
+        from .cache import get_cache_key
+        opt = _get_options(options)
+        with phase(stats, 'cache'):
+            for filepath in filepaths:
+                key = get_cache_key(json_database_schema, opt,
+                                    _get_format(filepath), prog, args)
+                if not cache.get(key, filepath):
+                    keys[filepath] = key
+        filepaths = list(keys)
+        if not filepaths:
+            return
+    schema_graph = get_graph(json_database_schema, label_cache=label_cache,
+                             backend=backend, stats=stats, **options)
+    with phase(stats, 'layout'):
+        _layout(schema_graph, prog, args, positions)
+    with phase(stats, 'draw'):
+        for filepath in filepaths:
+            _draw_replacing(schema_graph, filepath)
+            if cache is not None:
+                cache.put(keys[filepath], filepath)
+
+
+def render_bytes(json_database_schema, fmt='svg', output=None,
+                 compress=False, prog='dot', args='', label_cache=None,
+                 backend='pygraphviz', positions=None, stats=None,
+                 **options):
+    """
+    Render an ERD for a database in memory and return it as bytes.
+
+    *fmt* is the output format, e.g. 'svg', 'png' or 'pdf'; 'svgz' is
+    the same as 'svg' with *compress*. If *compress* is true, the output
+    is gzip compressed.
+
+    If *output* (a binary file-like object, e.g. a socket file or an
+    HTTP response) is given, the output is written to it in chunks
+    (compressed chunk by chunk) and None is returned.
+
+    The graph is closed as soon as it is drawn, so the graphviz graph
+    does not stay in memory while the output is compressed and written.
+    The other arguments are as for :func:`render`.
+    """
+    if fmt == 'svgz':
+        fmt, compress = 'svg', True
+    with measure(stats):
+        schema_graph = get_graph(json_database_schema,
+                                 label_cache=label_cache, backend=backend,
+                                 stats=stats, **options)
+        try:
+            with phase(stats, 'layout'):
+                _layout(schema_graph, prog, args, positions)
+            with phase(stats, 'draw'):
+                data = schema_graph.draw(format=fmt)
+        finally:
+            schema_graph.close()
+        with phase(stats, 'write'):
+            return _write_data(data, output, compress)
+
+
+_write_chunk_size = 1 << 20
+"""
+Number of bytes written to an output stream at once.
+"""
+
+
+def _write_data(data, output, compress):
+    """
+    Return *data* (compressed if *compress*), or write it to *output*.
+    """
+    if output is None:
+        return gzip.compress(data) if compress else data
+    if compress:
+        with gzip.GzipFile(fileobj=output, mode='wb') as gzip_file:
+            _write_chunks(gzip_file, data)
+    else:
+        _write_chunks(output, data)
+    output.flush()
+
+
+def _write_chunks(output, data):
+    view = memoryview(data)
+    for start in range(0, len(view), _write_chunk_size):
+        output.write(view[start:start + _write_chunk_size])
+
+
+def _layout(schema_graph, prog, args, positions):
+    """
+    Lay out *schema_graph*, keeping the stored *positions* if given.
+    """
+    if positions is not None:
+        from .positions import layout_stable
+        layout_stable(schema_graph, positions, prog=prog, args=args)
+    else:
+        schema_graph.layout(prog=prog, args=args)
+
+
+def _get_format(filepath):
+    """
+    Return the output format given by the extension of *filepath*.
+    """
+    fmt = os.path.splitext(filepath)[1].lstrip('.').lower()
+    if not fmt:
+        raise ValueError('No output format given in %s' % filepath)
+    return fmt
+
+
+def _draw(schema_graph, filepath):
+    """
+    Draw the laid out *schema_graph* to *filepath*.
+
+    'svgz' is compressed here, since graphviz fails to deflate large
+    SVG output.
+    """
+    fmt = _get_format(filepath)
+    if fmt == 'svgz':
+        svg = schema_graph.draw(format='svg')
+        with gzip.open(filepath, 'wb') as svgz_file:
+            svgz_file.write(svg)
+    else:
+        schema_graph.draw(filepath, format=fmt)
+
+
+def _draw_replacing(schema_graph, filepath):
+    """
+    Draw *schema_graph* to a temporary file, then replace *filepath*.
+
+    *filepath* is never written in place: it may be a hard link to an
+    entry of a :class:`jts_erd.cache.RenderCache` (with *link*), and
+    viewers never see a partially written file.
+    """
+    root, ext = os.path.splitext(filepath)
+    tmp_path = '%s.%s.tmp%s' % (root, uuid.uuid4().hex, ext)
+    try:
+        _draw(schema_graph, tmp_path)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def _new_graph(backend, **attrs):
+    """
+    Return a new, empty graph object for *backend* with *attrs*.
+
+    pygraphviz is only imported when needed.
+    """
+    if backend == 'pygraphviz':
+        import pygraphviz as pgv
+        return pgv.AGraph(**attrs)
+    if backend == 'dot':
+        from .dot import DotGraph
+        return DotGraph(**attrs)
+    raise ValueError('Unknown backend %s' % backend)
+
+
+def _get_options(options):
+    """
+    Return the effective options: *options* merged into the defaults.
+    """
+    opt = options_defaults.copy()
+    opt.update(options)
+    return opt
+
+
+def _get_detail(opt, schema):
+    """
+    Return the effective value ('full' or 'keys') of option 'detail'.
+
+    *schema* is a :class:`jts_erd.model.Schema`.
+    """
+    detail = opt['detail']
+    if detail == 'auto':
+        columns = sum(len(table.columns) for table in schema.tables.values())
+        return 'full' if columns <= auto_detail_columns else 'keys'
+    if detail not in ('full', 'keys'):
+        raise ValueError('Unknown detail %s' % detail)
+    return detail
+
+
+def _shows_some_columns(opt):
+    """
+    Return whether tables may not show all their columns.
+    """
+    return opt['detail'] != 'full' or opt['max_columns'] is not None
+
+
+def _get_shown_columns(opt, table):
+    """
+    Return the column index of the shown columns and the number of others.
+
+    The column index maps the names of the columns shown (cf. options
+    'detail' and 'max_columns') in the label of *table* (a
+    :class:`jts_erd.model.Table`) to (port, column) pairs, cf.
+    :func:`_get_port`. Primary key columns come first, then the other
+    columns in their order; key columns (in the primary key or a foreign
+    key) are always shown.
+    """
+    column_index = table.column_index
+    if not _shows_some_columns(opt):
+        return column_index, 0
+    key_columns = set(table.primary_key) | table.referenced_columns
+    for foreign_key in table.foreign_keys:
+        key_columns.update(foreign_key.column_names)
+    free = 0
+    if opt['detail'] == 'full':
+        free = opt['max_columns'] - len(key_columns & column_index.keys())
+    shown = []
+    for _, column in column_index.values():
+        if column.name in key_columns:
+            shown.append(column)
+        elif free > 0:
+            shown.append(column)
+            free -= 1
+    shown_index = {column.name: (i + 1, column)
+                   for i, column in enumerate(shown)}
+    return shown_index, len(column_index) - len(shown)
+
+
+def _get_shown_column_index(opt, shown_columns, table):
+    """
+    Return the column index of the shown columns of *table* (memoized).
+
+    *shown_columns* maps table keys to the column indexes already
+    computed by :func:`_get_shown_columns`; it must only be used for the
+    tables of one schema with the same *opt*.
     """
-    schema_graph = get_graph(json_database_schema, **options)
-    #print(schema_graph)
-    # alternatives: neato, dot, twopi, circo, fdp, nop, wc, acyclic,
-    #               gvpr, gvcolor, ccomps, sccmap, tred, sfdp
-    schema_graph.layout(prog='dot')
-    # print(schema_graph)
-    schema_graph.draw(filepath)
+    column_index = shown_columns.get(table.key)
+    if column_index is None:
+        column_index = _get_shown_columns(opt, table)[0]
+        shown_columns[table.key] = column_index
+    return column_index
+
 
+def _get_foreign_key_elements(opt, schema, table_names):
+    """
+    Return the graph elements of the foreign keys touching some tables.
 
-def _graph_add_table(opt, graph, namespace_name, table,
-                    default_namespace_name='public'):
+    Collect the helper nodes and edges :func:`get_graph` would add for
+    all foreign keys in *schema* (a :class:`jts_erd.model.Schema`) whose
+    tail or head table name is in *table_names*.
+    """
+    elements = _GraphElements()
+    shown_columns = {}
+    for namespace in schema.namespaces:
+        table_edges = set()
+        foreign_keys = []
+        for tail_table in namespace.tables:
+            for foreign_key in tail_table.foreign_keys:
+                if (tail_table.name not in table_names and
+                        foreign_key.head.name not in table_names):
+                    continue
+                if opt['display_columns']:
+                    foreign_keys.append(foreign_key)
+                else:
+                    table_edges.add((tail_table.name, foreign_key.head.name))
+        _graph_add_foreign_keys(opt, elements, foreign_keys, shown_columns)
+        for tail_table_name, head_table_name in table_edges:
+            elements.add_edge(tail_table_name, head_table_name,
+                              **_get_edge_attrs(opt, color='black'))
+    return elements
+
+
+class _GraphElements(object):
+    """
+    Record nodes and edges like a graph, but without building one.
+
+    Only the methods used for adding foreign key edges are provided.
+    """
+
+    def __init__(self):
+        self.nodes = {}  # maps node names to attributes
+        self.edges = {}  # maps (tail, head) to lists of attributes
+
+    def add_node(self, name, **attrs):
+        self.nodes[name] = attrs
+
+    def add_edge(self, tail, head, **attrs):
+        self.edges.setdefault((tail, head), []).append(attrs)
+
+
+def _graph_add_table(opt, graph, table, label):
     """
     Add a record-shaped node to *graph* with information on a *table*.
 
     All keys from `options_defaults` are allowed in *opt*.
+    *table* is a :class:`jts_erd.model.Table` and *label* its HTML
+    label (cf. :func:`_get_cached_table_label`).
+    """
+    graph.add_node(table.name, **_get_node_attrs(
+        opt,
+        id=table.name,
+        label=label,
+        style='filled',
+        color='white',
+        fontname=opt['fontname'],
+        fontsize=opt['fontsize'],
+        shape='plaintext',
+        tooltip=table.description or 'Table ' + table.name
+    ))
+
+
+def _get_node_defaults(opt):
+    """
+    Return the graph-level node attributes used with option 'lean'.
+    """
+    return {
+        'style': 'filled',
+        'color': 'white',
+        'fontname': opt['fontname'],
+        'fontsize': opt['fontsize'],
+        'shape': 'plaintext',
+    }
+
+
+def _get_edge_defaults(opt):
+    """
+    Return the graph-level edge attributes used with option 'lean'.
+
+    The defaults are those of the foreign key edges; without option
+    'display_columns' the edges only have a color.
+    """
+    defaults = {'color': 'black', 'label': ''}
+    if opt['display_columns']:
+        defaults.update(
+            penwidth=opt['edge_thickness'],
+            fontname=opt['fontname'],
+            fontsize=opt['fontsize_label'],
+            fontcolor='black',
+            arrowtail='none',
+            arrowhead='none',
+            dir='both',
+        )
+    return defaults
+
+
+def _get_node_attrs(opt, **attrs):
+    """
+    Return the node *attrs* to be set, given options 'lean' and 'tooltips'.
+    """
+    return _get_attrs(opt, attrs, _get_node_defaults)
+
+
+def _get_edge_attrs(opt, **attrs):
+    """
+    Return the edge *attrs* to be set, given options 'lean' and 'tooltips'.
+    """
+    return _get_attrs(opt, attrs, _get_edge_defaults)
+
+
+def _get_attrs(opt, attrs, get_defaults):
+    """
+    Remove tooltips (unless option 'tooltips' is set) from *attrs*.
+
+    With option 'lean' also remove the attributes having the default
+    value (cf. *get_defaults*) or no value; node labels are kept.
+    """
+    if not opt['tooltips']:
+        attrs.pop('tooltip', None)
+        attrs.pop('labeltooltip', None)
+    if opt['lean']:
+        defaults = get_defaults(opt)
+        attrs = {name: value for name, value in attrs.items()
+                 if (name == 'label' or value not in ('', None)) and
+                 (name not in defaults or
+                  str(value) != str(defaults[name]))}
+    return attrs
+
+
+def _get_cached_table_label(opt, table, default_namespace_name='public',
+                            label_cache=None):
+    """
+    Return the graphviz HTML label for a *table* node.
+
+    If a *label_cache* (a :class:`jts_erd.cache.LabelCache`) is given,
+    the label is taken from it or stored in it.
+    """
+    label = None
+    if label_cache is not None:
+        fingerprint = _get_table_fingerprint(opt, table,
+                                             default_namespace_name)
+        label = label_cache.get(fingerprint)
+    if label is None:
+        label = _get_table_label(opt, table, default_namespace_name)
+        if label_cache is not None:
+            label_cache.put(fingerprint, label)
+    return label
+
+
+def _get_table_label(opt, table, default_namespace_name='public'):
+    """
+    Return the graphviz HTML label for a *table* node.
+
+    The label contains a title row, rows for the primary key columns and
+    for all other columns and a row with extra indexes.
     """
-    table_name = table['name']
-    table_comment = table.get('description', '')
     display = ['name', 'type', 'combined']
-    title = (namespace_name + '.' if namespace_name != default_namespace_name
-             else '') + table_name
-    html_row0 = '<TR>\n    <TD COLOR="black" BGCOLOR="lightgrey"'\
+    nl, indent = ('', '') if opt['lean'] else ('\n', '    ')
+    title = (table.namespace_name + '.'
+             if table.namespace_name != default_namespace_name
+             else '') + table.name
+    html_row0 = '<TR>%s%s<TD COLOR="black" BGCOLOR="lightgrey"'\
                 ' COLSPAN="%s"><FONT POINT-SIZE="%s"><b>%s</b></FONT>'\
-                '<FONT POINT-SIZE="%s"><BR/>%s</FONT></TD>\n</TR>\n'\
-                % (str(len(display)), opt['fontsize_title'],
-                    title, opt['fontsize'], table_comment)
+                '<FONT POINT-SIZE="%s"><BR/>%s</FONT></TD>%s</TR>%s'\
+                % (nl, indent, str(len(display)), opt['fontsize_title'],
+                    title, opt['fontsize'], table.description, nl, nl)
     html_rows = [html_row0]
     if opt['display_columns']:
-        if 'primaryKey' in table:
-            pk = table['primaryKey']
-            for i, col_name in enumerate(pk):
-                col = [c for c in table['fields'] if c['name'] == col_name][0]
-                col_display = _get_column_display(display, table, col)
-                table_row_html = _get_table_row_html(
-                    opt, display, i + 1, col_display, highlight=True)
-                html_rows.append(table_row_html)
-        else:
-            pk = []
-        columns = [c for c in table['fields'] if c['name'] not in pk]
-        #sorted_columns = sorted(columns, key=lambda c: c['pos'])
-        for col_i, col in enumerate(columns):
-            col_display = _get_column_display(display, table, col)
-            html_row = _get_table_row_html(opt, display, col_i + len(pk) + 1,
-                                           col_display)
+        pk = set(table.primary_key)
+        column_index, hidden = _get_shown_columns(opt, table)
+        for port, col in column_index.values():
+            col_display = _get_column_display(display, table, col,
+                                              compact=opt['lean'])
+            html_row = _get_table_row_html(opt, display, port, col_display,
+                                           highlight=col.name in pk)
+            html_rows.append(html_row)
+        if hidden:
+            html_row = '<TR>%s%s<TD BGCOLOR="%s" ALIGN="LEFT"'\
+                       ' COLSPAN="%s">+%s more</TD>%s</TR>%s'\
+                       % (nl, indent, opt['html_color_default'],
+                          str(len(display)), hidden, nl, nl)
             html_rows.append(html_row)
-    if opt['display_indexes'] and 'indexes' in table:
-        indexes = [i for i in table['indexes'] if not i.get('unique')]
+    if opt['display_indexes'] and table.indexes:
+        indexes = [i for i in table.indexes if not i.unique]
         if indexes:
             index_definitions = ['<FONT POINT-SIZE="%s">%s</FONT>' %
-                                 (opt['fontsize'], index['definition'])
+                                 (opt['fontsize'], index.definition)
                                  for index in indexes]
             html_index_definitions = '<BR/>'.join(sorted(index_definitions))
-            html_row = '<TR>\n    <TD COLOR="black" BGCOLOR="%s"'\
-                       ' ALIGN="LEFT" COLSPAN="%s">Extra indexes:</TD>\n'\
-                       '    <TD COLOR="black" BGCOLOR="%s"'\
-                       ' ALIGN="LEFT" BALIGN="LEFT">%s</TD>\n</TR>\n'\
-                       % (opt['bgcolor_indexes'], str(len(display) - 1),
-                          opt['bgcolor_indexes'], html_index_definitions)
+            html_row = '<TR>%s%s<TD COLOR="black" BGCOLOR="%s"'\
+                       ' ALIGN="LEFT" COLSPAN="%s">Extra indexes:</TD>%s'\
+                       '%s<TD COLOR="black" BGCOLOR="%s"'\
+                       ' ALIGN="LEFT" BALIGN="LEFT">%s</TD>%s</TR>%s'\
+                       % (nl, indent, opt['bgcolor_indexes'],
+                          str(len(display) - 1), nl, indent,
+                          opt['bgcolor_indexes'], html_index_definitions,
+                          nl, nl)
             html_rows.append(html_row)
     html_table = '<TABLE ID="%s" ALIGN="LEFT" BORDER="0" CELLBORDER="0"'\
-                 ' CELLSPACING="0" BGCOLOR="%s">\n%s</TABLE>'\
-                 % ('table__' + table_name, 'black', ''.join(html_rows))
-    label = '<\n%s\n>' % html_table
-    graph.add_node(
-        table_name,
-        id=table_name,
-        label=label,
-        style='filled',
-        color='white',
-        fontname=opt['fontname'],
-        fontsize=opt['fontsize'],
-        shape='plaintext',
-        tooltip=table_comment or 'Table ' + table_name
+                 ' CELLSPACING="0" BGCOLOR="%s">%s%s</TABLE>'\
+                 % ('table__' + table.name, 'black', nl, ''.join(html_rows))
+    return '<%s%s%s>' % (nl, html_table, nl)
+
+
+label_format_version = 2
+"""
+Version of the table labels; bump it whenever :func:`_get_table_label`
+returns another label for a given table and options, so labels stored
+in a :class:`jts_erd.cache.LabelCache` file are not reused.
+"""
+
+_label_option_keys = (
+    'html_color_default',
+    'html_color_highlight',
+    'fontsize',
+    'fontsize_title',
+    'bgcolor_indexes',
+    'display_columns',
+    'display_indexes',
+    'lean',
+    'detail',
+    'max_columns',
+)
+"""
+Keys of the options which :func:`_get_table_label` depends on.
+"""
+
+
+def _get_table_fingerprint(opt, table, default_namespace_name='public'):
+    """
+    Return a hex digest of everything the label of a *table* depends on.
+    """
+    references = (sorted(table.referenced_columns)
+                  if _shows_some_columns(opt) else None)
+    canonical = json.dumps(
+        [label_format_version, default_namespace_name, table, references,
+         [opt[key] for key in _label_option_keys]],
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+        default=json_default
     )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
 
-def _get_column_display(display, table, column, pk=False):
+def _get_column_display(display, table, column, compact=False):
     """
     Return a list of strings describing a column.
 
-    The returned attributes and their order are given by *display*; allowed
-    attributes are:
+    *table* is a :class:`jts_erd.model.Table` and *column* one of its
+    :class:`jts_erd.model.Column`. The returned attributes and their
+    order are given by *display*; allowed attributes are:
 
       * name
       * type
       * combined (combined str with unique constraint information,
         default value and description texts)
+
+    If *compact* is true, no newlines are put after line breaks.
     """
     res = []
     for d in display:
         if d == 'name':
-            res.append(column['name'])
+            res.append(column.name)
         elif d == 'type':
-            res.append(column['type'])
+            res.append(column.type)
         elif d == 'combined':
             vals = []
-            if column.get('constraints'):
-                constr = column['constraints']
-                if 'required' in constr:
-                    vals.append(_format_attribute('null', constr['required']))
+            if column.required is not None:
+                vals.append(_format_attribute('null', column.required))
             uniques = []
-            table_unique = table.get('unique')
-            if table_unique:
-                for t_u_i, t_u in enumerate(table_unique):
-                    if column['name'] in t_u['fields']:
-                        i = t_u['fields'].index(column['name'])
-                        if len(t_u['fields']) == 1:
-                            uniques.append('UNIQ')
-                        else:
-                            uniques.append('UNIQ%s:%s'
-                                           % (str(t_u_i + 1), str(i + 1)))
-            if column.get('constraints'):
-                column_unique = column['constraints'].get('unique')
-                if 'UNIQ' not in uniques and column_unique:
+            for t_u_nr, i, t_u_len in table.unique_index.get(column.name,
+                                                             []):
+                if t_u_len == 1:
                     uniques.append('UNIQ')
+                else:
+                    uniques.append('UNIQ%s:%s' % (str(t_u_nr), str(i)))
+            if 'UNIQ' not in uniques and column.unique:
+                uniques.append('UNIQ')
             vals.append('; '.join(uniques))
-            default_value = 'DEFAULT=' + column['default_value']\
-                            if 'default_value' in column else ''
+            default_value = 'DEFAULT=' + column.default_value\
+                            if column.default_value is not None else ''
             vals.append(default_value)
-            description = column.get('description', '')
-            vals.append(description)
+            vals.append(column.description)
             text = '; '.join([v for v in vals if v]).replace('\n', '; ')
-            wrapped_text = '<BR/>\n'.join(textwrap.wrap(text, width=50))
+            line_break = '<BR/>' if compact else '<BR/>\n'
+            wrapped_text = line_break.join(textwrap.wrap(text, width=50))
             res.append(wrapped_text)
     return res
 
@@ -352,6 +889,8 @@ def _get_table_row_html(opt, display, port, table_cols,
                  else opt['html_color_default'])
         cols_html += '<TD BGCOLOR="%s" ALIGN="%s" BALIGN="%s"%s>%s</TD>'\
             % (color, align, align, port_, table_col)
+    if opt['lean']:
+        return '<TR>%s</TR>' % cols_html
     return '<TR>\n    %s\n</TR>\n' % cols_html
 
 
@@ -385,14 +924,164 @@ def _format_attribute(attribute_type, attribute_value):
         return attribute_value
 
 
+def _graph_add_foreign_keys(opt, schema_graph, foreign_keys,
+                            shown_columns):
+    """
+    Modify *schema_graph* by adding the edges for *foreign_keys*.
+
+    With option 'bundle_edges' the foreign keys between the same pair of
+    tables and multi-column foreign keys are added by
+    :func:`_graph_add_bundle`. *shown_columns* is as for
+    :func:`_get_shown_column_index`.
+    """
+    if not opt['bundle_edges']:
+        for foreign_key in foreign_keys:
+            _graph_add_foreign_key(opt, schema_graph, foreign_key,
+                                   shown_columns)
+        return
+    bundles = {}
+    for foreign_key in foreign_keys:
+        pair = (foreign_key.table.name, foreign_key.head.name)
+        bundles.setdefault(pair, []).append(foreign_key)
+    for bundle in bundles.values():
+        foreign_key = bundle[0]
+        if (len(bundle) == 1 and len(foreign_key.column_names) == 1 and
+                len(foreign_key.head_column_names) == 1):
+            _graph_add_foreign_key(opt, schema_graph, foreign_key,
+                                   shown_columns)
+        else:
+            _graph_add_bundle(opt, schema_graph, bundle, shown_columns)
+
+
+def _graph_add_bundle(opt, schema_graph, bundle, shown_columns):
+    """
+    Modify *schema_graph* by adding one edge for a *bundle* of foreign keys.
+
+    The foreign keys (:class:`jts_erd.model.ForeignKey`) in *bundle* all
+    have the same tail and head table. The edge gets the labels and
+    tooltips of all of them; it ends at the port of a column only if all
+    foreign keys have this single column at that end, and no helper
+    nodes are added. It is blue only if no foreign key is enforced and
+    has crowfoots only where all foreign keys agree on the cardinality.
+    """
+    port_l, port_r = ('f', 'i') if opt['rankdir'] == 'RL' else ('i', 'f')
+    foreign_key = bundle[0]
+    labels = []
+    tooltips = []
+    for bundled_foreign_key in bundle:
+        label, tooltip = _get_foreign_key_texts(opt, bundled_foreign_key)
+        if label:
+            labels.append(label)
+        tooltips.append(tooltip)
+    tail_port = ''
+    tail_columns = {tuple(fk.column_names) for fk in bundle}
+    if len(tail_columns) == 1 and len(foreign_key.column_names) == 1:
+        tail_port = port_r + str(_get_port(
+            _get_shown_column_index(opt, shown_columns, foreign_key.table),
+            foreign_key.column_names[0]))
+    head_port = ''
+    head_columns = {tuple(fk.head_column_names) for fk in bundle}
+    if len(head_columns) == 1 and len(foreign_key.head_column_names) == 1:
+        head_port = port_l + str(_get_port(
+            _get_shown_column_index(opt, shown_columns, foreign_key.head),
+            foreign_key.head_column_names[0]))
+    enforced = any(fk.enforced for fk in bundle)
+    cards_self = {fk.cardinality_self for fk in bundle}
+    cards_ref = {fk.cardinality_ref for fk in bundle}
+    _add_edge(
+        schema_graph,
+        foreign_key.table.name,
+        foreign_key.head.name,
+        tail_port,
+        head_port,
+        '\n'.join(labels),
+        '\n'.join(tooltips),
+        opt,
+        'black' if enforced else 'blue',
+        cards_self.pop() if len(cards_self) == 1 else None,
+        cards_ref.pop() if len(cards_ref) == 1 else None
+    )
+
+
+def _graph_add_foreign_key(opt, schema_graph, foreign_key, shown_columns):
+    """
+    Modify *schema_graph* by adding the edges for one *foreign_key*.
+
+    *foreign_key* is a :class:`jts_erd.model.ForeignKey`; *shown_columns*
+    is as for :func:`_get_shown_column_index`.
+    """
+    label, tooltip = _get_foreign_key_texts(opt, foreign_key)
+    _add_foreign_key_edge(
+        schema_graph,
+        foreign_key.table.name,
+        foreign_key.head.name,
+        _get_shown_column_index(opt, shown_columns, foreign_key.table),
+        _get_shown_column_index(opt, shown_columns, foreign_key.head),
+        foreign_key.column_names,
+        foreign_key.head_column_names,
+        label,
+        tooltip,
+        opt,
+        'black' if foreign_key.enforced else 'blue',
+        foreign_key.cardinality_self,
+        foreign_key.cardinality_ref
+    )
+
+
+def _get_foreign_key_texts(opt, foreign_key):
+    """
+    Return the label and the tooltip of the edge for a *foreign_key*.
+    """
+    tail_table_name = foreign_key.table.name
+    tail_column_names = foreign_key.column_names
+    head_table_name = foreign_key.head.name
+    head_column_names = foreign_key.head_column_names
+    card_self = foreign_key.cardinality_self
+    card_ref = foreign_key.cardinality_ref
+    if card_self or card_ref:
+        if opt['rankdir'] == 'RL':
+            label = '%s \u2194 %s' % (card_ref, card_self)
+        else:
+            label = '%s \u2194 %s' % (card_self, card_ref)
+    else:
+        label = ''
+    if opt['rankdir'] == 'RL':
+        tooltip = '%s     %s(%s) \u2194 %s(%s)' % (
+            label,
+            head_table_name,
+            ', '.join(head_column_names),
+            tail_table_name,
+            ', '.join(tail_column_names)
+        )
+    else:
+        tooltip = '%s     %s(%s) \u2194 %s(%s)' % (
+            label,
+            tail_table_name,
+            ', '.join(tail_column_names),
+            head_table_name,
+            ', '.join(head_column_names)
+        )
+    if foreign_key.label:
+        label += '\n' + foreign_key.label
+        tooltip += '     ' + foreign_key.label
+    else:
+        edge_name = foreign_key.name
+        if edge_name:
+            label += '   ' + edge_name
+            tooltip += '     ' + edge_name
+    return label.strip(), tooltip.strip()
+
+
 def _add_foreign_key_edge(schema_graph, tail_table_name, head_table_name,
-                          tail_table, head_table, tail_column_names,
-                          head_column_names, label, tooltip, opt, color,
-                          card_tail, card_head):
+                          tail_column_index, head_column_index,
+                          tail_column_names, head_column_names, label,
+                          tooltip, opt, color, card_tail, card_head):
     """
     Modify *schema_graph* by adding edges (for a foreign key relation).
 
     For multi-column relations also intermediate nodes are added.
+    *tail_column_index* and *head_column_index* must be the column
+    indexes of the tail and head table (cf. :func:`_get_port`).
     """
     port_l = 'i'
     port_r = 'f'
@@ -402,8 +1091,8 @@ def _add_foreign_key_edge(schema_graph, tail_table_name, head_table_name,
     if len(tail_column_names) > 1:
         tail_agg = 'tail agg %s%s->%s' % (
             tail_table_name, str(tail_column_names), head_table_name)
-        schema_graph.add_node(
-            tail_agg,
+        schema_graph.add_node(tail_agg, **_get_node_attrs(
+            opt,
             id=tail_table_name,
             label='',
             style='filled',
@@ -411,27 +1100,28 @@ def _add_foreign_key_edge(schema_graph, tail_table_name, head_table_name,
             arrowtail=None,
             arrowhead=None,
             shape='point'
-        )
+        ))
         for tail_column_name in tail_column_names:
-            tail_port = port_r + str(_get_port(tail_table, tail_column_name))
-            schema_graph.add_edge(
-                tail_table_name,
-                tail_agg,
+            tail_port = port_r + str(_get_port(tail_column_index,
+                                               tail_column_name))
+            schema_graph.add_edge(tail_table_name, tail_agg, **_get_edge_attrs(
+                opt,
                 tailport=tail_port,
                 penwidth=opt['edge_thickness'],
                 color=color,
                 dir='none'
-            )
+            ))
         tail_node = tail_agg
         tail_port = ''
     else:
         tail_node = tail_table_name
-        tail_port = port_r + str(_get_port(tail_table, tail_column_names[0]))
+        tail_port = port_r + str(_get_port(tail_column_index,
+                                           tail_column_names[0]))
     if len(head_column_names) > 1:
         head_agg = 'head agg %s->%s%s' % (
             tail_table_name, head_table_name, str(tail_column_names))
-        schema_graph.add_node(
-            head_agg,
+        schema_graph.add_node(head_agg, **_get_node_attrs(
+            opt,
             id=head_table_name,
             label='',
             style='filled',
@@ -439,26 +1129,34 @@ def _add_foreign_key_edge(schema_graph, tail_table_name, head_table_name,
             arrowtail=None,
             arrowhead=None,
             shape='point'
-        )
+        ))
         for head_column_name in head_column_names:
-            head_port = port_l + str(_get_port(head_table, head_column_name))
-            schema_graph.add_edge(
-                head_agg,
-                head_table_name,
+            head_port = port_l + str(_get_port(head_column_index,
+                                               head_column_name))
+            schema_graph.add_edge(head_agg, head_table_name, **_get_edge_attrs(
+                opt,
                 headport=head_port,
                 penwidth=opt['edge_thickness'],
                 color=color,
                 dir='none'
-            )
+            ))
         head_node = head_agg
         head_port = ''
     else:
         head_node = head_table_name
-        head_port = head_port = port_l + str(_get_port(head_table,
-                                                       head_column_names[0]))
-    schema_graph.add_edge(
-        tail_node,
-        head_node,
+        head_port = port_l + str(_get_port(head_column_index,
+                                           head_column_names[0]))
+    _add_edge(schema_graph, tail_node, head_node, tail_port, head_port, label,
+              tooltip, opt, color, card_tail, card_head)
+
+
+def _add_edge(schema_graph, tail_node, head_node, tail_port, head_port,
+              label, tooltip, opt, color, card_tail, card_head):
+    """
+    Modify *schema_graph* by adding the (main) edge of a foreign key.
+    """
+    schema_graph.add_edge(tail_node, head_node, **_get_edge_attrs(
+        opt,
         tailport=tail_port,
         headport=head_port,
         penwidth=opt['edge_thickness'],
@@ -472,28 +1170,18 @@ def _add_foreign_key_edge(schema_graph, tail_table_name, head_table_name,
         tooltip=tooltip,
         labeltooltip=tooltip,
         dir='both'
-    )
+    ))
 
 
-def _get_port(table, column):
+def _get_port(column_index, column):
     """
     Return the port number of a table column.
 
-    The port number is the row number in the html table, counting from 0.
-    Row 0 is the row containing the table name. It is followed by
-    rows describing primary key columns and then by all other columns.
+    *column_index* must be the column index of the column's
+    :class:`jts_erd.model.Table` as returned by :func:`_get_shown_columns`,
+    so the port is the row of the column in the table label.
     """
-    if 'primaryKey' in table:
-        pk = table['primaryKey']
-        if column in pk:
-            return int(pk.index(column)) + 1
-        offset = len(pk)
-    else:
-        pk = []
-        offset = 0
-    columns_non_pk = [c['name'] for c in table['fields']
-                      if c['name'] not in pk]
-    return columns_non_pk.index(column) + offset + 1
+    return column_index[column][0]
 
 
 def _get_crowfoot(cardinality, opt):
@@ -0,0 +1,365 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compact model of a JSON database schema.
+
+:func:`get_model` builds a :class:`Schema` from a JSON database schema
+in one pass. Its objects only hold what jts_erd renders; the ports of
+all columns and the head tables of all foreign keys are resolved while
+building. :func:`jts_erd.get_graph` accepts a :class:`Schema` instead of
+the JSON, so the model can be built once and rendered with different
+options.
+"""
+
+
+class _Record(object):
+    """
+    Base class of the model classes, comparing objects by their state.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._state() == other._state()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+
+class Schema(_Record):
+    """
+    A database schema.
+
+    *namespaces* is a list of :class:`Namespace`; *tables* maps
+    (namespace name, table name) keys to :class:`Table`;
+    *tables_with_edges* is the set of keys of the tables having at least
+    one foreign key edge.
+    """
+
+    __slots__ = ('database_name', 'generation_begin_time', 'namespaces',
+                 'tables', 'tables_with_edges')
+
+    def __init__(self, database_name, generation_begin_time):
+        self.database_name = database_name
+        self.generation_begin_time = generation_begin_time
+        self.namespaces = []
+        self.tables = {}
+        self.tables_with_edges = set()
+
+    def _state(self):
+        return [self.database_name, self.generation_begin_time,
+                self.namespaces]
+
+    def __reduce__(self):
+        """
+        Pickle flat, with foreign keys referring to head tables by key.
+
+        Pickling the linked tables recursively would exceed the recursion
+        limit on long chains of foreign keys (e.g. for process pools).
+        """
+        namespaces = [
+            (namespace.name,
+             [((table.namespace_name, table.name, table.description,
+                table.columns, table.primary_key, table.unique,
+                table.indexes),
+               [foreign_key._state() for foreign_key in table.foreign_keys])
+              for table in namespace.tables])
+            for namespace in self.namespaces
+        ]
+        return (_unpickle_schema,
+                (self.database_name, self.generation_begin_time, namespaces))
+
+
+class Namespace(_Record):
+    """
+    A namespace (datapackage) with a list of :class:`Table`.
+    """
+
+    __slots__ = ('name', 'tables')
+
+    def __init__(self, name):
+        self.name = name
+        self.tables = []
+
+    def _state(self):
+        return [self.name, self.tables]
+
+
+class Table(_Record):
+    """
+    A table (resource).
+
+    *columns* lists the :class:`Column` in the order of the JSON fields;
+    *column_index* maps column names to (port, column) pairs (cf.
+    :func:`jts_erd.jts_erd._get_port`); *unique_index* maps column names
+    to their unique constraints (cf. :func:`_get_unique_index`);
+    *referenced_columns* is the set of names of the columns referenced by
+    foreign keys (of any table). It is not compared, as it depends on the
+    other tables.
+    """
+
+    __slots__ = ('namespace_name', 'name', 'description', 'columns',
+                 'primary_key', 'unique', 'indexes', 'foreign_keys',
+                 'column_index', 'unique_index', 'referenced_columns')
+
+    def __init__(self, namespace_name, name, description, columns,
+                 primary_key, unique, indexes):
+        self.namespace_name = namespace_name
+        self.name = name
+        self.description = description
+        self.columns = columns
+        self.primary_key = primary_key
+        self.unique = unique
+        self.indexes = indexes
+        self.foreign_keys = []
+        self.referenced_columns = set()
+        self.column_index = _get_column_index(columns, primary_key)
+        self.unique_index = _get_unique_index(unique)
+
+    @property
+    def key(self):
+        return (self.namespace_name, self.name)
+
+    def _state(self):
+        return [self.namespace_name, self.name, self.description,
+                self.columns, self.primary_key, self.unique, self.indexes,
+                self.foreign_keys]
+
+
+class Column(_Record):
+    """
+    A table column (field).
+
+    *required* and *unique* are None if the JSON has no such constraint;
+    *default_value* is None if there is no default value.
+    """
+
+    __slots__ = ('name', 'type', 'description', 'default_value', 'required',
+                 'unique')
+
+    def __init__(self, name, type, description='', default_value=None,
+                 required=None, unique=None):
+        self.name = name
+        self.type = type
+        self.description = description
+        self.default_value = default_value
+        self.required = required
+        self.unique = unique
+
+    def _state(self):
+        return [self.name, self.type, self.description, self.default_value,
+                self.required, self.unique]
+
+
+class Index(_Record):
+    """
+    An index of a table.
+    """
+
+    __slots__ = ('definition', 'unique')
+
+    def __init__(self, definition, unique=False):
+        self.definition = definition
+        self.unique = unique
+
+    def _state(self):
+        return [self.definition, self.unique]
+
+
+class ForeignKey(_Record):
+    """
+    A foreign key from table *table* to table *head*.
+
+    *table* and *head* are :class:`Table` objects.
+    """
+
+    __slots__ = ('table', 'head', 'column_names', 'head_column_names',
+                 'enforced', 'cardinality_self', 'cardinality_ref', 'label',
+                 'name')
+
+    def __init__(self, table, head, column_names, head_column_names,
+                 enforced=True, cardinality_self=None, cardinality_ref=None,
+                 label=None, name=None):
+        self.table = table
+        self.head = head
+        self.column_names = column_names
+        self.head_column_names = head_column_names
+        self.enforced = enforced
+        self.cardinality_self = cardinality_self
+        self.cardinality_ref = cardinality_ref
+        self.label = label
+        self.name = name
+
+    def _state(self):
+        return [self.head.key, self.column_names, self.head_column_names,
+                self.enforced, self.cardinality_self, self.cardinality_ref,
+                self.label, self.name]
+
+
+def get_model(json_database_schema):
+    """
+    Return a :class:`Schema` for a JSON database schema.
+
+    A :class:`Schema` is returned unchanged. Raise a KeyError if a foreign
+    key references a table which does not exist.
+    """
+    if isinstance(json_database_schema, Schema):
+        return json_database_schema
+    schema = Schema(json_database_schema['database_name'],
+                    json_database_schema['generation_begin_time'])
+    foreign_keys = []
+    for namespace_json in json_database_schema['datapackages']:
+        namespace = Namespace(namespace_json['datapackage'])
+        schema.namespaces.append(namespace)
+        for table_json in namespace_json['resources']:
+            table = _get_table(namespace.name, table_json)
+            namespace.tables.append(table)
+            schema.tables[table.key] = table
+            for foreign_key_json in table_json.get('foreignKeys', []):
+                foreign_keys.append((table, foreign_key_json))
+    # resolve the foreign keys once all tables are known
+    for table, foreign_key_json in foreign_keys:
+        _add_foreign_key(
+            schema, _get_foreign_key(schema.tables, table, foreign_key_json))
+    return schema
+
+
+def json_default(obj):
+    """
+    Return a JSON serializable representation of a model object.
+
+    Use as *default* in :func:`json.dumps`, e.g. for hashing a model.
+    """
+    if isinstance(obj, _Record):
+        return [type(obj).__name__] + obj._state()
+    return str(obj)
+
+
+def _add_foreign_key(schema, foreign_key):
+    """
+    Add *foreign_key* to its table and record it in *schema*.
+    """
+    foreign_key.table.foreign_keys.append(foreign_key)
+    foreign_key.head.referenced_columns.update(foreign_key.head_column_names)
+    schema.tables_with_edges.add(foreign_key.table.key)
+    schema.tables_with_edges.add(foreign_key.head.key)
+
+
+def _unpickle_schema(database_name, generation_begin_time, namespaces):
+    """
+    Return a :class:`Schema` from the flat data of Schema.__reduce__.
+    """
+    schema = Schema(database_name, generation_begin_time)
+    foreign_keys = []
+    for namespace_name, tables in namespaces:
+        namespace = Namespace(namespace_name)
+        schema.namespaces.append(namespace)
+        for table_args, foreign_key_states in tables:
+            table = Table(*table_args)
+            namespace.tables.append(table)
+            schema.tables[table.key] = table
+            for foreign_key_state in foreign_key_states:
+                foreign_keys.append((table, foreign_key_state))
+    for table, (head_key, *args) in foreign_keys:
+        _add_foreign_key(
+            schema, ForeignKey(table, schema.tables[head_key], *args))
+    return schema
+
+
+def _get_table(namespace_name, table_json):
+    columns = []
+    for column_json in table_json['fields']:
+        constraints = column_json.get('constraints') or {}
+        columns.append(Column(
+            column_json['name'],
+            column_json['type'],
+            description=column_json.get('description', ''),
+            default_value=column_json.get('default_value'),
+            required=constraints.get('required'),
+            unique=constraints.get('unique')
+        ))
+    return Table(
+        namespace_name,
+        table_json['name'],
+        table_json.get('description', ''),
+        columns,
+        list(table_json.get('primaryKey', [])),
+        [list(unique['fields']) for unique in table_json.get('unique') or []],
+        [Index(index['definition'], bool(index.get('unique')))
+         for index in table_json.get('indexes', [])]
+    )
+
+
+def _get_foreign_key(tables, table, foreign_key_json):
+    reference = foreign_key_json['reference']
+    head_key = (reference['datapackage'], reference['resource'])
+    if head_key not in tables:
+        raise KeyError(head_key)
+    column_names = foreign_key_json['fields']
+    if isinstance(column_names, str):
+        column_names = [column_names]
+    return ForeignKey(
+        table,
+        tables[head_key],
+        list(column_names),
+        list(reference['fields']),
+        enforced=foreign_key_json.get('enforced', True),
+        cardinality_self=reference.get('cardinalitySelf'),
+        cardinality_ref=reference.get('cardinalityRef'),
+        label=reference.get('label'),
+        name=reference.get('name')
+    )
+
+
+def _get_column_index(columns, primary_key):
+    """
+    Return a dict mapping the column names to (port, column) pairs.
+
+    The port number is the row number in the html table, counting from 0.
+    Row 0 is the row containing the table name. It is followed by
+    rows describing primary key columns and then by all other columns.
+    """
+    columns_by_name = {column.name: column for column in columns}
+    column_index = {}
+    for i, column_name in enumerate(primary_key):
+        column_index[column_name] = (i + 1, columns_by_name[column_name])
+    primary_key_set = set(primary_key)
+    columns_non_pk = [column for column in columns
+                      if column.name not in primary_key_set]
+    for i, column in enumerate(columns_non_pk):
+        column_index[column.name] = (i + len(primary_key) + 1, column)
+    return column_index
+
+
+def _get_unique_index(unique):
+    """
+    Return a dict mapping column names to their unique constraints.
+
+    For each column name that is part of one or more of the *unique*
+    constraints (lists of column names) the value is a list of triples
+    (constraint number, position, number of constraint fields), where
+    the constraint number and the position of the column within the
+    constraint count from 1. The list is ordered by constraint number.
+    """
+    unique_index = {}
+    for t_u_i, fields in enumerate(unique):
+        for i, column_name in enumerate(fields):
+            entries = unique_index.setdefault(column_name, [])
+            if not entries or entries[-1][0] != t_u_i + 1:
+                entries.append((t_u_i + 1, i + 1, len(fields)))
+    return unique_index
@@ -0,0 +1,176 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Focused ERDs showing the neighborhood of some tables.
+
+A :class:`ForeignKeyIndex` is built once from a JSON database schema;
+it holds forward and reverse adjacency lists of the tables connected by
+foreign keys. :func:`get_neighborhood_graph` and
+:func:`save_svg_neighborhood` use it to render only the tables within
+a given number of foreign key hops from one or more seed tables.
+"""
+
+from .jts_erd import get_graph
+
+
+directions = ('both', 'referenced', 'referencing')
+"""
+Allowed directions for following foreign keys:
+
+  * **both**: follow foreign keys in both directions
+  * **referenced**: only follow foreign keys from a table to the tables
+    it references
+  * **referencing**: only follow foreign keys from a table to the
+    tables referencing it
+"""
+
+
+class ForeignKeyIndex(object):
+    """
+    Forward and reverse foreign key adjacency of a JSON database schema.
+
+    Tables are identified by (namespace name, table name) keys.
+    """
+
+    def __init__(self, json_database_schema):
+        self.json_database_schema = json_database_schema
+        self.tables = {}  # maps keys to tables
+        self.positions = {}  # maps keys to (namespace pos, table pos)
+        self.names = {}  # maps table names to lists of keys
+        self.referenced = {}  # maps keys to sets of referenced keys
+        self.referencing = {}  # maps keys to sets of referencing keys
+        namespaces = json_database_schema['datapackages']
+        for namespace_pos, namespace in enumerate(namespaces):
+            namespace_name = namespace['datapackage']
+            for table_pos, table in enumerate(namespace['resources']):
+                key = (namespace_name, table['name'])
+                self.tables[key] = table
+                self.positions[key] = (namespace_pos, table_pos)
+                self.names.setdefault(table['name'], []).append(key)
+                for foreign_key in table.get('foreignKeys', []):
+                    reference = foreign_key['reference']
+                    head_key = (reference['datapackage'],
+                                reference['resource'])
+                    self.referenced.setdefault(key, set()).add(head_key)
+                    self.referencing.setdefault(head_key, set()).add(key)
+
+    def resolve(self, table):
+        """
+        Return the key of *table*, given as key or as table name.
+
+        Raise a ValueError if the table does not exist or if the table
+        name is ambiguous.
+        """
+        if isinstance(table, tuple):
+            if table not in self.tables:
+                raise ValueError('Unknown table %s.%s' % table)
+            return table
+        keys = self.names.get(table, [])
+        if len(keys) != 1:
+            raise ValueError('%s table %s' % (
+                'Ambiguous' if keys else 'Unknown', table))
+        return keys[0]
+
+    def neighborhood(self, seeds, hops=1, direction='both'):
+        """
+        Return the keys of all tables at most *hops* foreign keys away.
+
+        *seeds* is an iterable of tables (keys or table names);
+        *direction* must be one of :any:`directions`.
+        """
+        if direction not in directions:
+            raise ValueError('Invalid direction %s' % direction)
+        adjacencies = []
+        if direction in ('both', 'referenced'):
+            adjacencies.append(self.referenced)
+        if direction in ('both', 'referencing'):
+            adjacencies.append(self.referencing)
+        found = {self.resolve(seed) for seed in seeds}
+        frontier = found
+        for _ in range(hops):
+            next_frontier = set()
+            for key in frontier:
+                for adjacency in adjacencies:
+                    next_frontier |= adjacency.get(key, set())
+            frontier = next_frontier - found
+            if not frontier:
+                break
+            found |= frontier
+        return found
+
+    def get_sub_schema(self, keys):
+        """
+        Return a JSON database schema containing only the tables in *keys*.
+
+        The order of namespaces and tables is kept and foreign keys to
+        tables not in *keys* are dropped.
+        """
+        keys = set(keys)
+        namespaces = self.json_database_schema['datapackages']
+        sub_namespaces = {}
+        for key in sorted(keys, key=self.positions.__getitem__):
+            namespace_pos = self.positions[key][0]
+            if namespace_pos not in sub_namespaces:
+                sub_namespace = dict(namespaces[namespace_pos])
+                sub_namespace['resources'] = []
+                sub_namespaces[namespace_pos] = sub_namespace
+            table = self.tables[key]
+            if 'foreignKeys' in table:
+                table = dict(table)
+                table['foreignKeys'] = [
+                    foreign_key for foreign_key in table['foreignKeys']
+                    if (foreign_key['reference']['datapackage'],
+                        foreign_key['reference']['resource']) in keys
+                ]
+            sub_namespaces[namespace_pos]['resources'].append(table)
+        sub_schema = dict(self.json_database_schema)
+        sub_schema['datapackages'] = [sub_namespaces[pos]
+                                      for pos in sorted(sub_namespaces)]
+        return sub_schema
+
+
+def get_neighborhood_graph(foreign_key_index, seeds, hops=1,
+                           direction='both', **options):
+    """
+    Create and return a graph of the neighborhood of some seed tables.
+
+    *foreign_key_index* must be a :class:`ForeignKeyIndex` (or a JSON
+    database schema, from which one is built). The graph contains
+    all tables at most *hops* foreign keys away from the *seeds*
+    following foreign keys in the given *direction* (cf.
+    :any:`directions`). All keys from
+    :any:`jts_erd.jts_erd.options_defaults` are allowed in *options*.
+    """
+    if not isinstance(foreign_key_index, ForeignKeyIndex):
+        foreign_key_index = ForeignKeyIndex(foreign_key_index)
+    keys = foreign_key_index.neighborhood(seeds, hops=hops,
+                                          direction=direction)
+    sub_schema = foreign_key_index.get_sub_schema(keys)
+    return get_graph(sub_schema, **options)
+
+
+def save_svg_neighborhood(foreign_key_index, seeds, filepath, hops=1,
+                          direction='both', **options):
+    """
+    Write an ERD in SVG format of the neighborhood of some seed tables.
+
+    Cf. :func:`get_neighborhood_graph`. *filepath* must end in '.svg'.
+    """
+    schema_graph = get_neighborhood_graph(foreign_key_index, seeds,
+                                          hops=hops, direction=direction,
+                                          **options)
+    schema_graph.layout(prog='dot')
+    schema_graph.draw(filepath)
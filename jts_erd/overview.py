@@ -0,0 +1,189 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Overview ERDs linked to detail ERDs of each table.
+
+For schemas too large for one detailed diagram, the overview
+(:func:`get_overview_graph`) shows only the table names and foreign key
+edges (like option display_columns=False). Each table node links to the
+detail diagram of that table (:func:`get_detail_graph`), which shows
+the table and its direct foreign key neighbors with all options. In a
+detail diagram the table links back to the overview and the neighbors
+link to their own detail diagrams.
+
+The links are relative, for this layout of files::
+
+  overview.svg
+  tables/NAMESPACE.TABLE.svg  (cf. get_detail_file_name)
+
+The links target the node ids (the table names), so a viewer scrolls to
+the table. (The ids of the HTML tables, 'table__' + table name, are not
+written to SVG by graphviz unless the table itself has a link.)
+
+:func:`save_overview` writes the overview and all detail diagrams (in
+parallel); :mod:`jts_erd.server` renders them on demand.
+"""
+
+import concurrent.futures
+import os
+import re
+
+from .jts_erd import get_graph
+from .neighborhood import ForeignKeyIndex
+
+
+overview_file_name = 'overview.svg'
+"""
+File name of the overview diagram.
+"""
+
+detail_directory = 'tables'
+"""
+Name of the directory (next to the overview) with the detail diagrams.
+"""
+
+
+def get_detail_file_name(key):
+    """
+    Return the file name of the detail diagram of a table.
+
+    *key* is the (namespace name, table name) of the table.
+    """
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', '%s.%s' % key) + '.svg'
+
+
+def get_overview_graph(foreign_key_index, **options):
+    """
+    Create and return the overview graph of a schema.
+
+    *foreign_key_index* must be a
+    :class:`jts_erd.neighborhood.ForeignKeyIndex` (or a JSON database
+    schema, from which one is built). All keys from
+    :any:`jts_erd.jts_erd.options_defaults` are allowed in *options*;
+    display_columns is always False.
+    """
+    foreign_key_index = _get_index(foreign_key_index)
+    options = dict(options, display_columns=False)
+    schema_graph = get_graph(foreign_key_index.json_database_schema,
+                             **options)
+    links = {}
+    for table_name, keys in foreign_key_index.names.items():
+        # tables with the same name share a node, which links to the first
+        links[table_name] = '%s/%s#%s' % (
+            detail_directory, get_detail_file_name(keys[0]), table_name)
+    _add_links(schema_graph, links)
+    return schema_graph
+
+
+def get_detail_graph(foreign_key_index, table, **options):
+    """
+    Create and return the detail graph of one table.
+
+    *foreign_key_index* is as for :func:`get_overview_graph`; *table* is
+    given as (namespace name, table name) or as table name (cf.
+    :meth:`jts_erd.neighborhood.ForeignKeyIndex.resolve`). All keys from
+    :any:`jts_erd.jts_erd.options_defaults` are allowed in *options*.
+    """
+    foreign_key_index = _get_index(foreign_key_index)
+    sub_schema, links = _get_detail(foreign_key_index,
+                                    foreign_key_index.resolve(table))
+    schema_graph = get_graph(sub_schema, **options)
+    _add_links(schema_graph, links)
+    return schema_graph
+
+
+def save_overview(json_database_schema, directory, processes=None,
+                  details=True, prog='dot', **options):
+    """
+    Write the overview and the detail diagrams (SVG) to *directory*.
+
+    The detail diagrams (only if *details* is true) are rendered using
+    up to *processes* worker processes (default: number of CPUs). *prog*
+    is the layout engine. All keys from
+    :any:`jts_erd.jts_erd.options_defaults` are allowed in *options*.
+
+    Return the path of the overview diagram.
+    """
+    foreign_key_index = _get_index(json_database_schema)
+    os.makedirs(directory, exist_ok=True)
+    overview_path = os.path.join(directory, overview_file_name)
+    schema_graph = get_overview_graph(foreign_key_index, **options)
+    schema_graph.layout(prog=prog)
+    schema_graph.draw(overview_path, format='svg')
+    del schema_graph
+    if not details:
+        return overview_path
+    os.makedirs(os.path.join(directory, detail_directory), exist_ok=True)
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        futures = [
+            executor.submit(
+                _save_detail,
+                os.path.join(directory, detail_directory,
+                             get_detail_file_name(key)),
+                *_get_detail(foreign_key_index, key),
+                prog,
+                options
+            )
+            for key in foreign_key_index.tables
+        ]
+        for future in futures:
+            future.result()
+    return overview_path
+
+
+def _get_index(foreign_key_index):
+    if isinstance(foreign_key_index, ForeignKeyIndex):
+        return foreign_key_index
+    return ForeignKeyIndex(foreign_key_index)
+
+
+def _get_detail(foreign_key_index, key):
+    """
+    Return the schema and the links of the detail diagram of a table.
+
+    The schema contains the table with *key* and its direct neighbors;
+    the links map their table names to URLs.
+    """
+    keys = foreign_key_index.neighborhood([key], hops=1)
+    links = {}
+    for other_key in keys:
+        if other_key == key:
+            links[key[1]] = '../%s#%s' % (overview_file_name, key[1])
+        elif other_key[1] != key[1]:
+            links[other_key[1]] = '%s#%s' % (
+                get_detail_file_name(other_key), other_key[1])
+    return foreign_key_index.get_sub_schema(keys), links
+
+
+def _add_links(schema_graph, links):
+    """
+    Let the nodes named in *links* link to the URLs there.
+    """
+    for table_name, url in links.items():
+        if schema_graph.has_node(table_name):
+            node = schema_graph.get_node(table_name)
+            node.attr['URL'] = url
+            node.attr['target'] = '_top'
+
+
+def _save_detail(filepath, sub_schema, links, prog, options):
+    """
+    Render a detail diagram (in a worker process).
+    """
+    schema_graph = get_graph(sub_schema, **options)
+    _add_links(schema_graph, links)
+    schema_graph.layout(prog=prog)
+    schema_graph.draw(filepath, format='svg')
@@ -0,0 +1,282 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Parallel layout of the connected components of an ERD.
+
+Tables which are not connected by foreign keys do not influence each
+other's placement, so the connected components of a schema can be laid
+out independently. :func:`get_packed_graph` computes the components from
+the model (cf. :mod:`jts_erd.model`), lays them out in a process pool
+and packs the resulting drawings side by side into the graph built by
+:func:`jts_erd.get_graph` (like graphviz' gvpack does).
+:func:`save_svg_packed` draws that graph without another layout run.
+"""
+
+import concurrent.futures
+import math
+
+from .jts_erd import _get_options, get_graph
+from .model import Namespace, Schema, get_model
+
+
+pack_margin = 16
+"""
+Space (in points) left between packed components.
+"""
+
+_node_position_attrs = ('pos', 'width', 'height', 'xlp')
+_edge_position_attrs = ('pos', 'lp', 'xlp', 'head_lp', 'tail_lp')
+_shifted_attrs = ('pos', 'lp', 'xlp', 'head_lp', 'tail_lp')
+
+
+def get_packed_graph(json_database_schema, processes=None, prog='dot',
+                     batch_size=50, **options):
+    """
+    Return a graph for *json_database_schema* with layout information.
+
+    *json_database_schema* may also be a :class:`jts_erd.model.Schema`.
+    The graph is built by :func:`jts_erd.get_graph` with the given
+    *options*; each of its connected components is laid out separately
+    with the graphviz layout program *prog* using up to *processes*
+    worker processes (default: number of CPUs). Small components are
+    handed to the workers in batches of at least *batch_size* tables.
+    """
+    opt = _get_options(options)
+    schema = get_model(json_database_schema)
+    components = _get_components(schema, opt)
+    sub_schemas = _get_sub_schemas(schema, components)
+    batches = _get_batches(sub_schemas, batch_size)
+    layouts = []
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        for batch_layouts in executor.map(
+                _layout_batch, batches,
+                [(prog, options)] * len(batches)):
+            layouts.extend(batch_layouts)
+    schema_graph = get_graph(schema, **options)
+    _apply_layouts(schema_graph, layouts)
+    return schema_graph
+
+
+def save_svg_packed(json_database_schema, filepath, processes=None,
+                    prog='dot', **options):
+    """
+    Write an ERD in SVG format laid out by :func:`get_packed_graph`.
+
+    *json_database_schema* may also be a :class:`jts_erd.model.Schema`;
+    *filepath* must end in '.svg'.
+    """
+    schema_graph = get_packed_graph(json_database_schema,
+                                    processes=processes, prog=prog,
+                                    **options)
+    schema_graph.draw(filepath, prog='nop2')
+
+
+def _get_components(schema, opt):
+    """
+    Return the connected components of the foreign key graph.
+
+    Each component is a list of (namespace name, table name) keys;
+    the components are ordered by decreasing size and the keys by their
+    order in *schema* (a :class:`jts_erd.model.Schema`). If option
+    'omit_isolated_tables' is set, isolated tables are not included.
+    """
+    parents = {key: key for key in schema.tables}
+
+    def find(key):
+        while parents[key] != key:
+            parents[key] = parents[parents[key]]
+            key = parents[key]
+        return key
+
+    for key, table in schema.tables.items():
+        for foreign_key in table.foreign_keys:
+            parents[find(key)] = find(foreign_key.head.key)
+    components = {}
+    for key in schema.tables:
+        if (not opt['omit_isolated_tables'] or
+                key in schema.tables_with_edges):
+            components.setdefault(find(key), []).append(key)
+    return sorted(components.values(), key=len, reverse=True)
+
+
+def _get_sub_schemas(schema, components):
+    """
+    Return models of *schema* limited to each component.
+
+    *components* are lists of table keys as returned by
+    :func:`_get_components`. All sub-schemas are built in one pass over
+    the tables, which are bucketed by their component. They share the
+    tables with *schema*; all foreign keys of a component stay within it.
+    """
+    component_numbers = {key: i for i, component in enumerate(components)
+                         for key in component}
+    sub_schemas = [Schema(schema.database_name, schema.generation_begin_time)
+                   for _ in components]
+    for namespace in schema.namespaces:
+        sub_namespaces = {}  # maps component numbers to namespaces
+        for table in namespace.tables:
+            i = component_numbers.get(table.key)
+            if i is None:
+                continue
+            sub_schema = sub_schemas[i]
+            sub_namespace = sub_namespaces.get(i)
+            if sub_namespace is None:
+                sub_namespace = sub_namespaces[i] = Namespace(namespace.name)
+                sub_schema.namespaces.append(sub_namespace)
+            sub_namespace.tables.append(table)
+            sub_schema.tables[table.key] = table
+            if table.key in schema.tables_with_edges:
+                sub_schema.tables_with_edges.add(table.key)
+    return sub_schemas
+
+
+def _get_batches(sub_schemas, batch_size):
+    """
+    Group *sub_schemas* into lists with at least *batch_size* tables.
+
+    The last batch may be smaller. The order is preserved.
+    """
+    batches = []
+    batch = []
+    batch_tables = 0
+    for sub_schema in sub_schemas:
+        batch.append(sub_schema)
+        batch_tables += len(sub_schema.tables)
+        if batch_tables >= batch_size:
+            batches.append(batch)
+            batch = []
+            batch_tables = 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _layout_batch(sub_schemas, prog_and_options):
+    """
+    Lay out the graphs for *sub_schemas* and return their positions.
+
+    For each sub schema return a triple: the bounding box, a dict mapping
+    node names to their position attributes and a dict mapping
+    (tail, head) to the position attributes of the edges between them
+    (in the order of the graph's edges).
+    """
+    prog, options = prog_and_options
+    layouts = []
+    for sub_schema in sub_schemas:
+        graph = get_graph(sub_schema, **options)
+        graph.layout(prog=prog)
+        nodes = {}
+        for node in graph.nodes():
+            nodes[str(node)] = {name: node.attr[name]
+                                for name in _node_position_attrs
+                                if node.attr[name]}
+        edges = {}
+        for edge in graph.edges():
+            edges.setdefault((str(edge[0]), str(edge[1])), []).append(
+                {name: edge.attr[name] for name in _edge_position_attrs
+                 if edge.attr[name]})
+        layouts.append((graph.graph_attr['bb'], nodes, edges))
+    return layouts
+
+
+def _apply_layouts(schema_graph, layouts):
+    """
+    Pack the component *layouts* and set positions in *schema_graph*.
+    """
+    boxes = []
+    for bb, _, _ in layouts:
+        llx, lly, urx, ury = [float(v) for v in bb.split(',')]
+        boxes.append((llx, lly, urx - llx, ury - lly))
+    offsets, width, height = _pack([(w, h) for _, _, w, h in boxes])
+    graph_edges = {}
+    for edge in schema_graph.edges():
+        graph_edges.setdefault((edge[0], edge[1]), []).append(edge)
+    for (llx, lly, _, _), (x, y), (_, nodes, edges) in zip(boxes, offsets,
+                                                             layouts):
+        dx = x - llx
+        dy = y - lly
+        for name, attrs in nodes.items():
+            node = schema_graph.get_node(name)
+            for attr_name, value in attrs.items():
+                if attr_name in _shifted_attrs:
+                    value = _shift_points(value, dx, dy)
+                node.attr[attr_name] = value
+        for pair, edge_attrs in edges.items():
+            for edge, attrs in zip(graph_edges.get(pair, []), edge_attrs):
+                for attr_name, value in attrs.items():
+                    edge.attr[attr_name] = _shift_points(value, dx, dy)
+    schema_graph.graph_attr['bb'] = '0,0,%.2f,%.2f' % (width, height)
+
+
+def _pack(sizes):
+    """
+    Place rectangles of the given *sizes* (width, height) in rows.
+
+    Return the lower left corners of the rectangles (in the order of
+    *sizes*) and the total width and height. The rectangles are placed
+    tallest first into rows of roughly equal width, aiming at an overall
+    square-ish shape, with :any:`pack_margin` between them.
+    """
+    if not sizes:
+        return [], 0, 0
+    area = sum((w + pack_margin) * (h + pack_margin) for w, h in sizes)
+    row_width = max(math.sqrt(area), max(w for w, _ in sizes))
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    rows = []  # lists of indexes
+    row = []
+    x = 0
+    for i in order:
+        w = sizes[i][0]
+        if row and x + w > row_width:
+            rows.append(row)
+            row = []
+            x = 0
+        row.append(i)
+        x += w + pack_margin
+    rows.append(row)
+    offsets = [None] * len(sizes)
+    total_width = 0
+    y = 0
+    for row in reversed(rows):  # y grows upwards; put the tallest on top
+        x = 0
+        row_height = max(sizes[i][1] for i in row)
+        for i in row:
+            offsets[i] = (x, y)
+            x += sizes[i][0] + pack_margin
+        total_width = max(total_width, x - pack_margin)
+        y += row_height + pack_margin
+    return offsets, total_width, y - pack_margin
+
+
+def _shift_points(value, dx, dy):
+    """
+    Shift all points in a graphviz position attribute *value*.
+
+    Handles points ('x,y'), splines ('e,x,y s,x,y x,y ...') and
+    lists of splines separated by ';'.
+    """
+    splines = []
+    for spline in value.split(';'):
+        points = []
+        for point in spline.split():
+            prefix = ''
+            if point[:2] in ('e,', 's,'):
+                prefix, point = point[:2], point[2:]
+            x, y = point.split(',')[:2]
+            points.append('%s%.2f,%.2f' % (prefix, float(x) + dx,
+                                           float(y) + dy))
+        splines.append(' '.join(points))
+    return ';'.join(splines)
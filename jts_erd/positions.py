@@ -0,0 +1,317 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Stable layouts reusing the node positions of a previous layout.
+
+:func:`layout_stable` lays out a graph built by :func:`jts_erd.get_graph`
+using a sidecar file (JSON) with the positions of the nodes and the
+splines of the edges from a previous layout:
+
+  * nodes whose label is unchanged keep their position,
+  * nodes with a changed label keep their center, unless they would
+    overlap another node now; such nodes and new nodes are placed in
+    a column next to the previous drawing,
+  * edges between unchanged nodes keep their splines, all other edges
+    are drawn as straight lines (by `neato -n2` with splines=line, as
+    spline routing in neato works on the whole graph and would cost
+    more than a full layout).
+
+This costs a fraction of a full layout and keeps diagrams of successive
+schema versions comparable. Without a sidecar file (or when no node of
+it matches, or when more than :any:`reroute_limit` of the edges would
+need routing), a full layout is run. Afterwards the sidecar file is
+(re)written. Only the pygraphviz backend is supported.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+
+from .dot import DotGraph
+from .jts_erd import _new_graph
+from .pack import _edge_position_attrs
+
+
+positions_format_version = 1
+"""
+Version of the sidecar file format.
+"""
+
+placement_margin = 18
+"""
+Space (in points) kept between placed nodes and other nodes.
+"""
+
+reroute_limit = 0.2
+"""
+Share of the edges which may need routing without a full layout.
+"""
+
+
+def layout_stable(schema_graph, filepath, prog='dot', args=''):
+    """
+    Lay out *schema_graph* reusing the positions stored in *filepath*.
+
+    *prog* and *args* are used for a full layout (cf.
+    :func:`jts_erd.render`). Return the set of names of the nodes which
+    had to be placed (all nodes after a full layout).
+    """
+    if isinstance(schema_graph, DotGraph):
+        raise ValueError('Stable layouts need the pygraphviz backend')
+    stored = load_positions(filepath)
+    placed = _apply_positions(schema_graph, stored) if stored else None
+    if placed is not None:
+        routed = sum(1 for edge in schema_graph.edges()
+                     if not edge.attr['pos'])
+        if routed > reroute_limit * schema_graph.number_of_edges():
+            placed = None
+    if placed is None:
+        _clear_positions(schema_graph)
+        schema_graph.layout(prog=prog, args=args)
+        placed = {str(node) for node in schema_graph.nodes()}
+        save_positions(schema_graph, filepath)
+        return placed
+    # keep all positions (no overlap removal) in the passes of neato -n2
+    schema_graph.graph_attr['overlap'] = 'true'
+    splines = schema_graph.graph_attr['splines']
+    try:
+        if placed:
+            _place_nodes(schema_graph, placed, stored['nodes'],
+                         _get_sizes(schema_graph, placed))
+        schema_graph.graph_attr['splines'] = 'line'
+        schema_graph.layout(prog='nop2')
+    finally:
+        schema_graph.graph_attr['splines'] = splines
+    save_positions(schema_graph, filepath)
+    return placed
+
+
+def save_positions(schema_graph, filepath):
+    """
+    Write the positions of a laid out *schema_graph* to *filepath*.
+    """
+    nodes = {}
+    for node in schema_graph.nodes():
+        nodes[str(node)] = {
+            'pos': node.attr['pos'],
+            'width': node.attr['width'],
+            'height': node.attr['height'],
+            'label': _get_label_digest(node.attr['label']),
+        }
+    edges = []
+    for edge in schema_graph.edges():
+        attrs = {name: edge.attr[name] for name in _edge_position_attrs
+                 if edge.attr[name]}
+        if 'pos' in attrs:
+            edges.append([_get_edge_key(edge), attrs])
+    positions = {
+        'version': positions_format_version,
+        'bb': schema_graph.graph_attr['bb'],
+        'nodes': nodes,
+        'edges': edges,
+    }
+    tmp_path = '%s.%s.tmp' % (filepath, os.getpid())
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as positions_file:
+            json.dump(positions, positions_file, separators=(',', ':'))
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def load_positions(filepath):
+    """
+    Return the positions stored in *filepath*.
+
+    Return None if the file does not exist or has another format version.
+    """
+    try:
+        with open(filepath, encoding='utf-8') as positions_file:
+            positions = json.load(positions_file)
+    except FileNotFoundError:
+        return None
+    if positions.get('version') != positions_format_version:
+        return None
+    return positions
+
+
+def _apply_positions(schema_graph, positions):
+    """
+    Set the stored *positions* on the nodes and edges of *schema_graph*.
+
+    Nodes with a changed label get their stored position, too. Return
+    the names of the new and changed nodes, or None if no node is known.
+    """
+    stored_nodes = positions['nodes']
+    placed = set()
+    for node in schema_graph.nodes():
+        name = str(node)
+        stored = stored_nodes.get(name)
+        if stored is None:
+            node.attr['pos'] = '0,0'  # preliminary
+            placed.add(name)
+            continue
+        node.attr['pos'] = stored['pos']
+        if stored['label'] != _get_label_digest(node.attr['label']):
+            placed.add(name)
+    if len(placed) == schema_graph.number_of_nodes():
+        return None
+    stored_edges = {}
+    for key, attrs in positions['edges']:
+        stored_edges.setdefault(tuple(key), []).append(attrs)
+    for edge in schema_graph.edges():
+        if edge[0] in placed or edge[1] in placed:
+            continue
+        edge_attrs = stored_edges.get(_get_edge_key(edge))
+        if edge_attrs:
+            for name, value in edge_attrs.pop(0).items():
+                edge.attr[name] = value
+    return placed
+
+
+def _clear_positions(schema_graph):
+    """
+    Remove the positions set by :func:`_apply_positions`.
+    """
+    for node in schema_graph.nodes():
+        node.attr['pos'] = ''
+    for edge in schema_graph.edges():
+        for name in _edge_position_attrs:
+            if edge.attr[name]:
+                edge.attr[name] = ''
+
+
+def _get_sizes(schema_graph, names):
+    """
+    Return the sizes (width, height in points) of the nodes in *names*.
+
+    Only these nodes are laid out (in a separate graph with the defaults
+    of *schema_graph*), so the cost does not depend on the graph size.
+    """
+    graph = _new_graph('pygraphviz', strict=False, directed=True)
+    try:
+        graph.graph_attr.update(schema_graph.graph_attr)
+        graph.graph_attr.update(overlap='true', splines='false')
+        graph.node_attr.update(schema_graph.node_attr)
+        for name in names:
+            attrs = {key: value
+                     for key, value in schema_graph.get_node(name).attr.items()
+                     if value}
+            if attrs.get('label'):  # table labels are HTML labels
+                attrs['label'] = '<%s>' % attrs['label']
+            attrs['pos'] = '0,0'
+            graph.add_node(name, **attrs)
+        graph.layout(prog='nop2')
+        return {str(node): (float(node.attr['width']) * 72,
+                            float(node.attr['height']) * 72)
+                for node in graph.nodes()}
+    finally:
+        graph.close()
+
+
+def _place_nodes(schema_graph, placed, stored_nodes, sizes):
+    """
+    Position the nodes named in *placed*.
+
+    *stored_nodes* are the nodes from the sidecar file; *sizes* are the
+    current sizes of the nodes in *placed* (cf. :func:`_get_sizes`).
+    Changed nodes keep their position unless they overlap another node.
+    The others are stacked in a new column next to the bounding box
+    (right of it for rankdir 'LR', else left of it); helper nodes
+    (without label) are put between their neighbors. Edges touching
+    any of these nodes lose their splines, so they get routed.
+    """
+    boxes = {}
+    for node in schema_graph.nodes():
+        name = str(node)
+        stored = stored_nodes.get(name)
+        if stored is None:
+            continue
+        width, height = sizes.get(name) or (float(stored['width']) * 72,
+                                            float(stored['height']) * 72)
+        boxes[name] = _get_box(node.attr['pos'], width, height)
+    movable = set()
+    for name in placed:
+        if name not in stored_nodes:
+            movable.add(name)
+        elif any(_overlap(boxes[name], box) for other, box in boxes.items()
+                 if other != name):
+            movable.add(name)
+    for name in movable:
+        boxes.pop(name, None)
+    if boxes:
+        min_x = min(box[0] for box in boxes.values())
+        max_x = max(box[2] for box in boxes.values())
+        top = max(box[3] for box in boxes.values())
+    else:
+        min_x = max_x = top = 0
+    tables = sorted(name for name in movable
+                    if schema_graph.get_node(name).attr['label'])
+    width = max([sizes[name][0] for name in tables] or [0])
+    if schema_graph.graph_attr['rankdir'] == 'LR':
+        x = max_x + placement_margin + width / 2
+    else:
+        x = min_x - placement_margin - width / 2
+    y = top
+    for name in tables:
+        node = schema_graph.get_node(name)
+        height = sizes[name][1]
+        node.attr['pos'] = '%.2f,%.2f' % (x, y - height / 2)
+        y -= height + placement_margin
+    for name in movable.difference(tables):
+        neighbors = [schema_graph.get_node(other).attr['pos']
+                     for other in schema_graph.neighbors(name)
+                     if other not in movable or other in tables]
+        points = [[float(v) for v in pos.split(',')[:2]]
+                  for pos in neighbors if pos]
+        if points:
+            schema_graph.get_node(name).attr['pos'] = '%.2f,%.2f' % (
+                sum(p[0] for p in points) / len(points),
+                sum(p[1] for p in points) / len(points))
+        else:
+            schema_graph.get_node(name).attr['pos'] = '%.2f,%.2f' % (x, y)
+    for edge in schema_graph.edges():
+        if edge[0] in placed or edge[1] in placed:
+            for name in _edge_position_attrs:
+                if edge.attr[name]:
+                    edge.attr[name] = ''
+
+
+def _get_box(pos, width, height):
+    """
+    Return the bounding box (x0, y0, x1, y1) of a node.
+
+    *pos* is the node's center ('x,y'), *width* and *height* are in points.
+    """
+    x, y = [float(v) for v in pos.split(',')[:2]]
+    return (x - width / 2, y - height / 2, x + width / 2, y + height / 2)
+
+
+def _overlap(box1, box2):
+    return (box1[0] < box2[2] and box2[0] < box1[2] and
+            box1[1] < box2[3] and box2[1] < box1[3])
+
+
+def _get_edge_key(edge):
+    return (str(edge[0]), str(edge[1]), edge.attr['tailport'] or '',
+            edge.attr['headport'] or '', edge.attr['label'] or '')
+
+
+def _get_label_digest(label):
+    return hashlib.sha256((label or '').encode('utf-8')).hexdigest()[:16]
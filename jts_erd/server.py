@@ -0,0 +1,451 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A local HTTP server rendering ERDs for the schema files in a directory.
+
+``GET /`` lists the JSON database schema files (``*.json``) in the
+directory; ``GET /NAME.svg`` (or ``.png``, ``.pdf``) renders ``NAME.json``
+on first request. Options from :any:`jts_erd.jts_erd.options_defaults`
+can be given as query parameters with JSON values, e.g.
+``/NAME.svg?rankdir="RL"&display_columns=false``.
+
+``GET /NAME/overview.svg`` renders the overview of ``NAME.json`` and
+``GET /NAME/tables/NAMESPACE.TABLE.svg`` the detail diagram of a table,
+to which the overview links (cf. :mod:`jts_erd.overview`); the detail
+diagrams are only rendered when requested. For these the parsed schema
+files are kept in memory.
+
+Renderings and table labels are kept in bounded in-memory LRU caches.
+Each response has an ETag computed from a hash of the schema file, the
+options and the format, so browsers revalidate with conditional
+requests and get ``304 Not Modified`` until the schema file changes.
+Concurrent requests for the same diagram wait for a single render.
+
+The server is meant for local use only. With the 'dot' backend
+(default) the graphs are laid out by graphviz subprocesses, so several
+diagrams render in parallel; with 'pygraphviz' renders are serialized
+(cf. :any:`jts_erd.aio.cgraph_lock`).
+
+Run with ``python -m jts_erd.server DIRECTORY``.
+"""
+
+import argparse
+import collections
+import hashlib
+import html
+import json
+import os
+import threading
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import stream
+from .aio import cgraph_lock
+from .cache import LabelCache, get_cache_key
+from .jts_erd import (_get_options, _option_choices, get_graph,
+                      options_defaults)
+from .neighborhood import ForeignKeyIndex
+from .overview import (detail_directory, get_detail_file_name,
+                       get_detail_graph, get_overview_graph,
+                       overview_file_name)
+
+
+content_types = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'pdf': 'application/pdf',
+}
+"""
+The output formats served and their content types.
+"""
+
+
+class ERDServer(ThreadingHTTPServer):
+    """
+    HTTP server for the ERDs of the schema files in *directory*.
+
+    *max_bytes* bounds the size of the rendering cache and *max_labels*
+    the number of table labels kept (cf.
+    :class:`jts_erd.cache.LabelCache`). *prog* is the layout engine;
+    *options* are the default options, which query parameters override.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, directory, address=('127.0.0.1', 8000),
+                 max_bytes=256 << 20, max_labels=10000, backend='dot',
+                 prog='dot', **options):
+        super().__init__(address, _Handler)
+        self.directory = directory
+        self.backend = backend
+        self.prog = prog
+        self.options = options
+        self.label_cache = LabelCache(max_entries=max_labels)
+        self._renderings = _LRUCache(max_bytes)
+        self._digests = {}  # schema path -> ((mtime, size), digest)
+        self._indexes = {}  # schema path -> ((mtime, size), index, keys)
+        self._renders = {}  # key -> _Render in progress
+        self._lock = threading.Lock()
+
+    def get_etag(self, name, fmt, options, view=None):
+        """
+        Return the ETag of a rendering, or None if there is no such schema.
+
+        *view* is None for the whole ERD, 'overview' for the overview or
+        the file name (without extension) of a detail diagram.
+
+        The ETag is the cache key of the rendering (cf.
+        :func:`jts_erd.cache.get_cache_key`), computed with the hash of
+        the schema file instead of the schema.
+        """
+        path = self._get_schema_path(name)
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        state = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(path)
+        if cached is None or cached[0] != state:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as schema_file:
+                for chunk in iter(lambda: schema_file.read(1 << 20), b''):
+                    digest.update(chunk)
+            cached = (state, digest.hexdigest())
+            self._digests[path] = cached
+        opt = _get_options(dict(self.options, **options))
+        if view is None:
+            return get_cache_key(cached[1], opt, fmt, self.prog)
+        if view != 'overview' and view not in self._get_index(path)[1]:
+            return None
+        return get_cache_key([cached[1], view], opt, fmt, self.prog)
+
+    def get_rendering(self, name, fmt, options, etag, view=None):
+        """
+        Return the rendering (bytes) with *etag*, rendering it if needed.
+
+        Concurrent calls for the same *etag* share one render.
+        """
+        with self._lock:
+            data = self._renderings.get(etag)
+            if data is not None:
+                return data
+            render = self._renders.get(etag)
+            owner = render is None
+            if owner:
+                render = self._renders[etag] = _Render()
+        if not owner:
+            return render.wait()
+        try:
+            data = self._render(name, fmt, options, view)
+        except BaseException as exc:
+            render.set(error=exc)
+            raise
+        else:
+            render.set(data=data)
+            with self._lock:
+                self._renderings.put(etag, data)
+            return data
+        finally:
+            with self._lock:
+                del self._renders[etag]
+
+    def _render(self, name, fmt, options, view):
+        path = self._get_schema_path(name)
+        if view is None:
+            with open(path, encoding='utf-8') as f:
+                args = (stream.load(f),)
+            get = get_graph
+        else:
+            foreign_key_index, detail_keys = self._get_index(path)
+            if view == 'overview':
+                args = (foreign_key_index,)
+                get = get_overview_graph
+            else:
+                args = (foreign_key_index, detail_keys[view])
+                get = get_detail_graph
+        options = dict(self.options, **options)
+        if self.backend == 'pygraphviz':
+            with cgraph_lock:
+                return self._draw(get(*args, label_cache=self.label_cache,
+                                      **options), fmt)
+        return self._draw(get(*args, label_cache=self.label_cache,
+                              backend=self.backend, **options), fmt)
+
+    def _draw(self, schema_graph, fmt):
+        """
+        Lay out and draw *schema_graph*, then close it (cf.
+        :func:`jts_erd.render_bytes`).
+        """
+        try:
+            schema_graph.layout(prog=self.prog)
+            return schema_graph.draw(format=fmt)
+        finally:
+            schema_graph.close()
+
+    def _get_index(self, path):
+        """
+        Return the foreign key index of a schema file and its detail keys.
+
+        The detail keys map the file names (without extension) of the
+        detail diagrams to table keys.
+        """
+        stat = os.stat(path)
+        state = (stat.st_mtime_ns, stat.st_size)
+        cached = self._indexes.get(path)
+        if cached is None or cached[0] != state:
+            with open(path, encoding='utf-8') as f:
+                foreign_key_index = ForeignKeyIndex(stream.load(f))
+            detail_keys = {get_detail_file_name(key)[:-4]: key
+                           for key in foreign_key_index.tables}
+            cached = (state, foreign_key_index, detail_keys)
+            self._indexes[path] = cached
+        return cached[1:]
+
+    def _get_schema_path(self, name):
+        return os.path.join(self.directory, name + '.json')
+
+    def get_schema_names(self):
+        """
+        Return the sorted names of the schema files.
+        """
+        return sorted(entry.name[:-5] for entry in os.scandir(self.directory)
+                      if entry.name.endswith('.json') and entry.is_file())
+
+
+class _Render(object):
+    """
+    A render in progress, which other threads can wait for.
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._data = None
+        self._error = None
+
+    def set(self, data=None, error=None):
+        self._data = data
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._data
+
+
+class _LRUCache(object):
+    """
+    Least recently used bytes values, at most *max_bytes* in total.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = collections.OrderedDict()
+
+    def get(self, key):
+        data = self._items.get(key)
+        if data is not None:
+            self._items.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        if key in self._items:
+            self.size -= len(self._items.pop(key))
+        self._items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def _handle(self, send_body):
+        url = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(url.path).lstrip('/')
+        if not path:
+            self._send(HTTPStatus.OK, 'text/html; charset=utf-8',
+                       self._get_index().encode('utf-8'), send_body)
+            return
+        parsed = _parse_path(path)
+        if parsed is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        name, view, fmt = parsed
+        try:
+            options = self._get_options(url.query)
+        except ValueError as exc:
+            self.send_error(HTTPStatus.BAD_REQUEST, str(exc))
+            return
+        try:
+            etag = self.server.get_etag(name, fmt, options, view)
+        except Exception as exc:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR,
+                            '%s: %s' % (type(exc).__name__, exc))
+            return
+        if etag is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        etag = '"%s"' % etag
+        if etag in self._get_if_none_match():
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        try:
+            data = self.server.get_rendering(name, fmt, options, etag, view)
+        except Exception as exc:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR,
+                            '%s: %s' % (type(exc).__name__, exc))
+            return
+        self._send(HTTPStatus.OK, content_types[fmt], data, send_body,
+                   etag=etag)
+
+    def _get_options(self, query):
+        """
+        Return the options given as query parameters (with JSON values).
+
+        Raise a ValueError for unknown options and invalid values.
+        """
+        options = {}
+        for key, value in urllib.parse.parse_qsl(query):
+            if key not in options_defaults:
+                raise ValueError('Unknown option %s' % key)
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+            if not _is_valid_option(key, value):
+                raise ValueError('Invalid value for option %s: %r'
+                                 % (key, value))
+            options[key] = value
+        return options
+
+    def _get_if_none_match(self):
+        header = self.headers.get('If-None-Match', '')
+        return {etag.strip().replace('W/', '', 1)
+                for etag in header.split(',')}
+
+    def _get_index(self):
+        items = ''.join(
+            '<li><a href="%s.svg">%s</a> (<a href="%s/%s">overview</a>)'
+            '</li>\n'
+            % (urllib.parse.quote(name), html.escape(name),
+               urllib.parse.quote(name), overview_file_name)
+            for name in self.server.get_schema_names())
+        return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                '<title>ERDs</title></head>\n<body><ul>\n%s</ul></body>'
+                '</html>\n' % items)
+
+    def _send(self, status, content_type, data, send_body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+
+def _is_valid_option(key, value):
+    """
+    Return whether *value* is valid for option *key*.
+
+    The value must be one of the choices (if any) or of the type of the
+    default value; numbers may be int or float and max_columns is a
+    non-negative int or None.
+    """
+    default = options_defaults[key]
+    if key in _option_choices:
+        return value in _option_choices[key]
+    if isinstance(default, bool) or isinstance(value, bool):
+        return isinstance(default, bool) and isinstance(value, bool)
+    if default is None:  # max_columns
+        return value is None or (isinstance(value, int) and value >= 0)
+    if isinstance(default, (int, float)):
+        return isinstance(value, (int, float))
+    return isinstance(value, type(default))
+
+
+def _parse_path(path):
+    """
+    Return (schema name, view, format) for a request path, or None.
+
+    The view is as for :meth:`ERDServer.get_etag`.
+    """
+    name, _, fmt = path.rpartition('.')
+    name, _, view = name.partition('/')
+    if fmt not in content_types or not name or name.startswith('.'):
+        return None
+    if not view:
+        return name, None, fmt
+    if view == overview_file_name.rpartition('.')[0]:
+        return name, 'overview', fmt
+    directory, _, view = view.partition('/')
+    if directory != detail_directory or not view or '/' in view:
+        return None
+    return name, view, fmt
+
+
+def main(argv=None):
+    """
+    Command line interface: serve the ERDs until interrupted.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m jts_erd.server',
+        description='Serve ERDs for the JSON database schema files in a'
+                    ' directory.')
+    parser.add_argument('directory')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--cache-size', type=int, default=256,
+                        help='size of the rendering cache in MiB')
+    parser.add_argument('--label-cache-size', type=int, default=10000,
+                        help='number of table labels kept in memory')
+    parser.add_argument('--backend', default='dot',
+                        choices=('dot', 'pygraphviz'))
+    parser.add_argument('--prog', default='dot', help='layout engine')
+    args = parser.parse_args(argv)
+    server = ERDServer(args.directory, (args.host, args.port),
+                       max_bytes=args.cache_size << 20,
+                       max_labels=args.label_cache_size,
+                       backend=args.backend, prog=args.prog)
+    print('Serving ERDs for %s on http://%s:%s/'
+          % (args.directory, args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
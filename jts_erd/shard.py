@@ -0,0 +1,226 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Sharded rendering: one ERD per namespace (datapackage).
+
+:func:`save_sharded` renders a separate diagram for each datapackage of
+a schema, in parallel, and writes an index page linking all of them.
+
+Foreign keys crossing namespaces are drawn to (or from) stub nodes:
+reduced tables showing only the columns taking part in the cross
+namespace foreign keys, which link to the diagram of their namespace.
+Stubs are named 'NAMESPACE.TABLE', so they never clash with the tables
+of the shard.
+"""
+
+import concurrent.futures
+import html
+import os
+import re
+
+from .jts_erd import _draw_replacing, _get_options, get_graph
+
+
+_stub_namespace_name = 'public'
+"""
+Name of the pseudo namespace holding the stub tables of a shard.
+"""
+
+
+def save_sharded(json_database_schema, directory, processes=None, cache=None,
+                 **options):
+    """
+    Write one SVG ERD per namespace and an index page to *directory*.
+
+    The diagrams are rendered using up to *processes* worker processes
+    (default: number of CPUs). If *cache* (a
+    :class:`jts_erd.cache.RenderCache`) is given, it is used for each
+    diagram individually. All keys from
+    :any:`jts_erd.jts_erd.options_defaults` are allowed in *options*.
+
+    Return the path of the index page.
+    """
+    os.makedirs(directory, exist_ok=True)
+    namespaces = json_database_schema['datapackages']
+    file_names = {namespace['datapackage']:
+                  get_shard_file_name(namespace['datapackage'])
+                  for namespace in namespaces}
+    shards = [_get_shard_schema(json_database_schema,
+                                namespace['datapackage'])
+              for namespace in namespaces]
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        futures = [
+            executor.submit(
+                _save_shard,
+                shard_schema,
+                os.path.join(directory, file_names[namespace['datapackage']]),
+                {key: file_names[key[0]] for key in stub_keys},
+                cache,
+                options
+            )
+            for namespace, (shard_schema, stub_keys) in zip(namespaces,
+                                                            shards)
+        ]
+        for future in futures:
+            future.result()
+    index_path = os.path.join(directory, 'index.html')
+    with open(index_path, 'w', encoding='utf-8') as index_file:
+        index_file.write(_get_index_html(json_database_schema, file_names,
+                                         shards))
+    return index_path
+
+
+def get_shard_file_name(namespace_name):
+    """
+    Return the file name of the SVG diagram for a namespace.
+    """
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', namespace_name) + '.svg'
+
+
+def _get_shard_schema(json_database_schema, namespace_name):
+    """
+    Return the schema for the shard of namespace *namespace_name*.
+
+    Return a pair: the schema, containing the namespace itself and stub
+    tables from other namespaces, and the list of (namespace name, table
+    name) of the stubs. The stubs are renamed (cf. :func:`_get_stub_name`)
+    and put into a pseudo namespace 'public' (the default namespace,
+    whose name is not prefixed to table titles); the foreign keys of the
+    shard's tables are changed accordingly.
+    """
+    stubs = {}  # maps keys of stub tables to stub tables
+
+    def get_stub(stub_namespace_name, table):
+        key = (stub_namespace_name, table['name'])
+        if key not in stubs:
+            stubs[key] = {
+                'name': _get_stub_name(key),
+                'description': 'see %s' % stub_namespace_name,
+                'fields': [],
+            }
+        return stubs[key]
+
+    def add_stub_fields(stub, table, column_names):
+        present = {field['name'] for field in stub['fields']}
+        for field in table['fields']:
+            if field['name'] in column_names and field['name'] not in present:
+                stub['fields'].append(field)
+
+    tables = {}
+    for namespace in json_database_schema['datapackages']:
+        for table in namespace['resources']:
+            tables[(namespace['datapackage'], table['name'])] = table
+    shard_namespace = None
+    for namespace in json_database_schema['datapackages']:
+        other_namespace_name = namespace['datapackage']
+        if other_namespace_name == namespace_name:
+            shard_namespace = namespace
+            continue
+        # foreign keys from other namespaces into this namespace
+        for table in namespace['resources']:
+            for foreign_key in table.get('foreignKeys', []):
+                if foreign_key['reference']['datapackage'] != namespace_name:
+                    continue
+                stub = get_stub(other_namespace_name, table)
+                columns = foreign_key['fields']
+                if isinstance(columns, str):
+                    columns = [columns]
+                add_stub_fields(stub, table, columns)
+                stub.setdefault('foreignKeys', []).append(foreign_key)
+    # foreign keys from this namespace into other namespaces
+    shard_tables = []
+    for table in shard_namespace['resources']:
+        foreign_keys = []
+        for foreign_key in table.get('foreignKeys', []):
+            reference = foreign_key['reference']
+            if reference['datapackage'] != namespace_name:
+                head_key = (reference['datapackage'], reference['resource'])
+                stub = get_stub(reference['datapackage'], tables[head_key])
+                add_stub_fields(stub, tables[head_key], reference['fields'])
+                foreign_key = dict(foreign_key, reference=dict(
+                    reference, datapackage=_stub_namespace_name,
+                    resource=stub['name']))
+            foreign_keys.append(foreign_key)
+        if foreign_keys:
+            table = dict(table, foreignKeys=foreign_keys)
+        shard_tables.append(table)
+    shard_schema = dict(json_database_schema)
+    shard_schema['datapackages'] = [dict(shard_namespace,
+                                         resources=shard_tables)]
+    if stubs:
+        shard_schema['datapackages'].append({
+            'datapackage': _stub_namespace_name,
+            'resources': list(stubs.values()),
+        })
+    return shard_schema, list(stubs)
+
+
+def _get_stub_name(key):
+    """
+    Return the name of the stub for table *key* (namespace, table name).
+    """
+    return '%s.%s' % key
+
+
+def _save_shard(shard_schema, filepath, stub_links, cache, options):
+    """
+    Render the diagram of one shard to *filepath*.
+
+    *stub_links* maps the keys of stub tables to the file names of the
+    diagrams they link to.
+    """
+    if cache is not None:
+        from .cache import get_cache_key
+        key = get_cache_key(shard_schema, _get_options(options))
+        if cache.get(key, filepath):
+            return
+    schema_graph = get_graph(shard_schema, **options)
+    for key, file_name in stub_links.items():
+        stub_name = _get_stub_name(key)
+        if schema_graph.has_node(stub_name):
+            node = schema_graph.get_node(stub_name)
+            node.attr['URL'] = '%s#%s' % (file_name, key[1])
+            node.attr['target'] = '_top'
+    schema_graph.layout(prog='dot')
+    # filepath may be a hard link to a cache entry: never write in place
+    _draw_replacing(schema_graph, filepath)
+    if cache is not None:
+        cache.put(key, filepath)
+
+
+def _get_index_html(json_database_schema, file_names, shards):
+    """
+    Return an HTML page linking the diagrams of all shards.
+    """
+    database = html.escape(json_database_schema['database_name'])
+    datetime = html.escape(json_database_schema['generation_begin_time'])
+    items = []
+    for shard_schema, stub_keys in shards:
+        namespace = shard_schema['datapackages'][0]
+        namespace_name = namespace['datapackage']
+        items.append(
+            '<li><a href="%s">%s</a> (%s tables, %s linked tables'
+            ' in other namespaces)</li>'
+            % (html.escape(file_names[namespace_name], quote=True),
+               html.escape(namespace_name),
+               len(namespace['resources']),
+               len(stub_keys))
+        )
+    return ('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            '<title>Database %s</title>\n</head>\n<body>\n'
+            '<h1>Database %s (as of %s)</h1>\n<ul>\n%s\n</ul>\n'
+            '</body>\n</html>\n'
+            % (database, database, datetime, '\n'.join(items)))
@@ -0,0 +1,170 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Instrumentation of the phases of rendering an ERD.
+
+Pass a :class:`RenderStats` as *stats* to :func:`jts_erd.get_graph`,
+:func:`jts_erd.render` or :func:`jts_erd.save_svg` to record the wall
+and CPU time of each phase, the numbers of nodes and edges, the total
+size of the HTML labels and the maximum resident set size; optionally
+the peak Python memory is traced with :mod:`tracemalloc` and the whole
+render is profiled with :mod:`cProfile`. Without *stats* nothing is
+measured.
+
+The phases are:
+
+  * **model**: building the :class:`jts_erd.model.Schema`
+  * **labels**: building (or looking up) the HTML labels of the tables
+  * **nodes**: adding the table nodes to the graph
+  * **edges**: adding the foreign key edges (and helper nodes)
+  * **cache**: looking up renderings in a :class:`jts_erd.cache.RenderCache`
+  * **layout**: the graphviz layout
+  * **draw**: drawing (all output files)
+  * **write**: compressing and writing the output of
+    :func:`jts_erd.render_bytes`
+"""
+
+import contextlib
+import cProfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+
+class RenderStats(object):
+    """
+    Statistics of one or more renders.
+
+    *phases* maps phase names to dicts with keys 'wall' and 'cpu'
+    (seconds, summed over all renders) and 'calls'; *counts* maps
+    'tables', 'nodes', 'helper_nodes', 'edges' and 'label_bytes' to the
+    sizes of the last graph built. *max_rss* is the maximum resident set
+    size of the process (bytes, including graphviz), where available.
+
+    If *trace_memory* is true, *peak_memory* is the peak memory (bytes)
+    allocated by Python while measuring. Tracing slows down Python code
+    several times, so the phase timings are not reliable then.
+
+    If *profile* (a file path) is given, the renders are profiled and
+    the profile is written to it (cf. :mod:`pstats`).
+    """
+
+    def __init__(self, profile=None, trace_memory=False):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self.counts = {}
+        self.peak_memory = None
+        self.max_rss = None
+        self._depth = 0
+        self._profiler = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        """
+        Start measuring memory and profiling (reentrant).
+        """
+        self._depth += 1
+        if self._depth == 1:
+            if self.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started_tracemalloc = True
+                tracemalloc.reset_peak()
+            if self.profile:
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile)
+            self._profiler = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak_memory = max(self.peak_memory or 0, peak)
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux
+            self.max_rss = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager adding the time spent in it to phase *name*.
+        """
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            totals = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0,
+                                                   'calls': 0})
+            totals['wall'] += time.perf_counter() - wall
+            totals['cpu'] += time.process_time() - cpu
+            totals['calls'] += 1
+
+    def as_dict(self):
+        """
+        Return the statistics as a dict (serializable as JSON).
+        """
+        return {
+            'phases': self.phases,
+            'counts': self.counts,
+            'peak_memory': self.peak_memory,
+            'max_rss': self.max_rss,
+        }
+
+    def __str__(self):
+        lines = ['%-8s %10s %10s' % ('phase', 'wall [s]', 'cpu [s]')]
+        for name, totals in self.phases.items():
+            lines.append('%-8s %10.3f %10.3f'
+                         % (name, totals['wall'], totals['cpu']))
+        for name, count in self.counts.items():
+            lines.append('%s: %s' % (name, count))
+        if self.peak_memory is not None:
+            lines.append('peak_memory: %s' % self.peak_memory)
+        if self.max_rss is not None:
+            lines.append('max_rss: %s' % self.max_rss)
+        return '\n'.join(lines)
+
+
+def measure(stats):
+    """
+    Return *stats* as context manager, or a no-op one if it is None.
+    """
+    return stats if stats is not None else _no_phase
+
+
+def phase(stats, name):
+    """
+    Return a context manager timing phase *name* (if *stats* is given).
+    """
+    return stats.phase(name) if stats is not None else _no_phase
+
+
+_no_phase = contextlib.nullcontext()
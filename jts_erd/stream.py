@@ -0,0 +1,269 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Streaming reader for large JSON database schemas.
+
+The JSON produced by pg_jts contains much that jts_erd never renders,
+e.g. the SQL creating each index. :func:`load` reads such a file
+incrementally, one table (resource) at a time, and keeps only the
+projection of each table used by :func:`jts_erd.get_graph` (cf.
+:func:`project_table`). Thus peak memory is determined by the retained
+projection and the largest single table, not by the size of the file.
+
+:func:`load_ndjson` reads a newline-delimited variant: the first line
+holds the schema object without 'datapackages'; each further line holds
+one resource with an additional key 'datapackage' naming its namespace.
+
+:func:`iter_datapackages` yields the projected datapackages one by one.
+"""
+
+import json
+
+
+_table_keys = ('name', 'description', 'fields', 'primaryKey', 'foreignKeys',
+               'unique', 'indexes')
+_field_keys = ('name', 'type', 'description', 'default_value')
+_constraint_keys = ('required', 'unique')
+_foreign_key_keys = ('fields', 'enforced')
+_reference_keys = ('datapackage', 'resource', 'fields', 'cardinalitySelf',
+                   'cardinalityRef', 'label', 'name')
+_index_keys = ('definition', 'unique')
+
+
+def project_table(table):
+    """
+    Return a copy of *table* reduced to what jts_erd renders.
+    """
+    projection = _project(table, _table_keys)
+    if 'fields' in projection:
+        projection['fields'] = [_project_field(field)
+                                for field in projection['fields']]
+    if 'foreignKeys' in projection:
+        projection['foreignKeys'] = [_project_foreign_key(foreign_key)
+                                     for foreign_key
+                                     in projection['foreignKeys']]
+    if 'unique' in projection:
+        projection['unique'] = [{'fields': unique['fields']}
+                                for unique in projection['unique']]
+    if 'indexes' in projection:
+        projection['indexes'] = [_project(index, _index_keys)
+                                 for index in projection['indexes']]
+    return projection
+
+
+def load(fp, chunk_size=1 << 16):
+    """
+    Read a JSON database schema from file object *fp* incrementally.
+
+    Return the schema with all tables projected by :func:`project_table`.
+    """
+    json_database_schema = {}
+    datapackages = list(iter_datapackages(fp, json_database_schema,
+                                          chunk_size=chunk_size))
+    json_database_schema['datapackages'] = datapackages
+    return json_database_schema
+
+
+def load_ndjson(fp):
+    """
+    Read a newline-delimited JSON database schema from file object *fp*.
+
+    Return the schema with all tables projected by :func:`project_table`.
+    """
+    json_database_schema = None
+    datapackages = {}
+    for line in fp:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if json_database_schema is None:
+            json_database_schema = item
+            json_database_schema['datapackages'] = []
+            continue
+        namespace_name = item['datapackage']
+        if namespace_name not in datapackages:
+            datapackages[namespace_name] = {'datapackage': namespace_name,
+                                            'resources': []}
+            json_database_schema['datapackages'].append(
+                datapackages[namespace_name])
+        datapackages[namespace_name]['resources'].append(project_table(item))
+    return json_database_schema
+
+
+def iter_datapackages(fp, header=None, chunk_size=1 << 16):
+    """
+    Yield the datapackages of a JSON database schema read from *fp*.
+
+    The resources of each datapackage are projected with
+    :func:`project_table`. The other top-level items of the schema
+    are stored in dict *header* (if given) as they are encountered;
+    hence it is complete only after the generator is exhausted.
+    """
+    reader = _Reader(fp, chunk_size)
+    reader.expect('{')
+    for key in reader.iter_object_keys():
+        if key == 'datapackages':
+            reader.expect('[')
+            for _ in reader.iter_array_items():
+                yield _read_datapackage(reader)
+        else:
+            value = reader.value()
+            if header is not None:
+                header[key] = value
+
+
+def _read_datapackage(reader):
+    """
+    Read one datapackage object, projecting its resources.
+    """
+    datapackage = {}
+    reader.expect('{')
+    for key in reader.iter_object_keys():
+        if key == 'resources':
+            reader.expect('[')
+            datapackage['resources'] = [
+                project_table(reader.value())
+                for _ in reader.iter_array_items()]
+        else:
+            value = reader.value()
+            if key == 'datapackage':
+                datapackage[key] = value
+    return datapackage
+
+
+def _project(item, keys):
+    return {key: item[key] for key in keys if key in item}
+
+
+def _project_field(field):
+    projection = _project(field, _field_keys)
+    if field.get('constraints'):
+        projection['constraints'] = _project(field['constraints'],
+                                             _constraint_keys)
+    return projection
+
+
+def _project_foreign_key(foreign_key):
+    projection = _project(foreign_key, _foreign_key_keys)
+    projection['reference'] = _project(foreign_key['reference'],
+                                       _reference_keys)
+    return projection
+
+
+class _Reader(object):
+    """
+    Incremental reader for the structural tokens and values of JSON.
+
+    Complete values are decoded with :meth:`json.JSONDecoder.raw_decode`
+    from a buffer which is refilled from *fp* as needed.
+    """
+
+    _whitespace = ' \t\n\r'
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """
+        Append data to the buffer; return False at the end of the file.
+        """
+        if self.eof:
+            return False
+        size = max(self.chunk_size, len(self.buffer) - self.pos)
+        data = self.fp.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Return the next non-whitespace character (without consuming it).
+        """
+        while True:
+            while (self.pos < len(self.buffer) and
+                   self.buffer[self.pos] in self._whitespace):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON input')
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError('Expected %r, found %r' % (char, found))
+        self.pos += 1
+
+    def value(self):
+        """
+        Decode and return the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number at the end of the buffer may be incomplete
+            if end < len(self.buffer) or not self._fill():
+                self.pos = end
+                return value
+
+    def iter_object_keys(self):
+        """
+        Yield the keys of an object whose '{' has been consumed.
+
+        After each key (and ':') the caller must consume the value.
+        """
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect('}')
+                return
+
+    def iter_array_items(self):
+        """
+        Yield once per item of an array whose '[' has been consumed.
+
+        On each iteration the caller must consume the item.
+        """
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect(']')
+                return
@@ -0,0 +1,278 @@
+# Copyright 2015 ibu radempa <ibu@radempa.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Preflight validation of JSON database schemas.
+
+:func:`validate` checks a whole JSON database schema in one linear pass
+and returns all problems found, each with its location in the JSON, so
+that a broken schema can be rejected before the (expensive) layout.
+Errors are problems on which :func:`jts_erd.get_graph` would fail or
+draw wrong edges:
+
+  * missing keys (e.g. a table without 'fields')
+  * duplicate tables and duplicate columns
+  * primary key and foreign key columns which do not exist
+  * referenced tables and columns which do not exist
+  * foreign keys whose number of columns differs from the number of
+    referenced columns
+
+Warnings are problems on which the ERD is still drawn:
+
+  * tables with the same name in different namespaces (the nodes are
+    named by the table names, so these tables share one node)
+  * unknown cardinalities (drawn without crowfoots)
+
+:func:`check` raises a :class:`SchemaError` if there are errors.
+"""
+
+
+cardinalities = ('0..1', '1', '0..N', '1..N')
+"""
+The known cardinalities of foreign keys (cf. jts_erd._get_crowfoot).
+"""
+
+_valid_cardinalities = frozenset(cardinalities + (None, ''))
+
+
+class Problem(object):
+    """
+    A problem found in a JSON database schema.
+
+    *severity* is 'error' or 'warning'; *location* is the path of the
+    offending JSON value, e.g. 'datapackages[0].resources[3].fields[1]'.
+    """
+
+    __slots__ = ('severity', 'location', 'message')
+
+    def __init__(self, severity, location, message):
+        self.severity = severity
+        self.location = location
+        self.message = message
+
+    def __str__(self):
+        return '%s: %s: %s' % (self.severity, self.location, self.message)
+
+    def __repr__(self):
+        return 'Problem(%r, %r, %r)' % (self.severity, self.location,
+                                        self.message)
+
+
+class SchemaError(ValueError):
+    """
+    Raised by :func:`check` with the list of *problems* (errors only).
+    """
+
+    def __init__(self, problems):
+        super().__init__('\n'.join(str(problem) for problem in problems))
+        self.problems = problems
+
+
+def check(json_database_schema):
+    """
+    Validate *json_database_schema*; raise a :class:`SchemaError` on errors.
+
+    Return the list of warnings (cf. :func:`validate`).
+    """
+    problems = validate(json_database_schema)
+    errors = [problem for problem in problems if problem.severity == 'error']
+    if errors:
+        raise SchemaError(errors)
+    return problems
+
+
+def validate(json_database_schema):
+    """
+    Return a list of all :class:`Problem` in *json_database_schema*.
+
+    The problems are ordered by location, except that the problems of
+    foreign keys follow those of all tables. Valid parts are checked
+    by fast paths; locations are only built for problems.
+    """
+    problems = []
+    for key in ('database_name', 'generation_begin_time', 'datapackages'):
+        if key not in json_database_schema:
+            _error(problems, '', "missing key '%s'" % key)
+    tables = {}  # maps keys to sets of column names
+    names = {}  # maps table names to the first key with that name
+    foreign_keys = []  # (location, column names, foreign key JSON)
+    namespaces = json_database_schema.get('datapackages', ())
+    for i, namespace_json in enumerate(namespaces):
+        location = 'datapackages[%d]' % i
+        namespace_name = namespace_json.get('datapackage')
+        if namespace_name is None:
+            _error(problems, location, "missing key 'datapackage'")
+        if 'resources' not in namespace_json:
+            _error(problems, location, "missing key 'resources'")
+        for j, table_json in enumerate(namespace_json.get('resources', ())):
+            table_location = _TableLocation((i, j))
+            table_name = table_json.get('name')
+            if table_name is None:
+                _error(problems, table_location, "missing key 'name'")
+                continue
+            key = (namespace_name, table_name)
+            column_names = _validate_columns(problems, table_location,
+                                             table_json)
+            if key in tables:
+                _error(problems, table_location,
+                       'duplicate table %s.%s' % key)
+            elif names.setdefault(table_name, key) != key:
+                _warning(problems, table_location,
+                         'table name %s is also used in namespace %s (the'
+                         ' tables share a node)'
+                         % (table_name, names[table_name][0]))
+            tables[key] = column_names
+            primary_key = table_json.get('primaryKey', ())
+            if not column_names.issuperset(primary_key):
+                for k, column_name in enumerate(primary_key):
+                    if column_name not in column_names:
+                        _error(problems,
+                               '%s.primaryKey[%d]' % (table_location, k),
+                               'primary key column %s does not exist'
+                               % column_name)
+            for k, foreign_key_json in enumerate(
+                    table_json.get('foreignKeys', ())):
+                foreign_keys.append((table_location, k, column_names,
+                                     foreign_key_json))
+    # check the foreign keys once all tables are known
+    for table_location, k, column_names, foreign_key_json in foreign_keys:
+        if not _is_valid_foreign_key(tables, column_names, foreign_key_json):
+            _validate_foreign_key(
+                problems, tables,
+                '%s.foreignKeys[%d]' % (table_location, k),
+                column_names, foreign_key_json)
+    return problems
+
+
+def _validate_columns(problems, location, table_json):
+    """
+    Validate the fields of a table and return the set of column names.
+    """
+    fields = table_json.get('fields')
+    try:
+        column_names = {column_json['name'] for column_json in fields}
+        if (len(column_names) == len(fields) and
+                all('type' in column_json for column_json in fields)):
+            return column_names
+    except (KeyError, TypeError):
+        pass
+    column_names = set()
+    if fields is None:
+        _error(problems, location, "missing key 'fields'")
+        return column_names
+    for i, column_json in enumerate(table_json['fields']):
+        column_name = column_json.get('name')
+        if column_name is None:
+            _error(problems, '%s.fields[%d]' % (location, i),
+                   "missing key 'name'")
+            continue
+        if 'type' not in column_json:
+            _error(problems, '%s.fields[%d]' % (location, i),
+                   "missing key 'type'")
+        if column_name in column_names:
+            _error(problems, '%s.fields[%d]' % (location, i),
+                   'duplicate column %s' % column_name)
+        column_names.add(column_name)
+    return column_names
+
+
+def _is_valid_foreign_key(tables, column_names, foreign_key_json):
+    """
+    Return whether a foreign key is valid (a fast check without details).
+    """
+    try:
+        reference = foreign_key_json['reference']
+        fields = foreign_key_json['fields']
+        head_fields = reference['fields']
+        head_column_names = tables[(reference['datapackage'],
+                                    reference['resource'])]
+        if isinstance(fields, str):
+            fields = [fields]
+        return (0 < len(fields) == len(head_fields) and
+                column_names.issuperset(fields) and
+                head_column_names.issuperset(head_fields) and
+                reference.get('cardinalitySelf') in _valid_cardinalities and
+                reference.get('cardinalityRef') in _valid_cardinalities)
+    except (KeyError, TypeError):
+        return False
+
+
+def _validate_foreign_key(problems, tables, location, column_names,
+                          foreign_key_json):
+    """
+    Validate a foreign key of a table with columns *column_names*.
+    """
+    reference = foreign_key_json.get('reference')
+    if reference is None:
+        _error(problems, location, "missing key 'reference'")
+        reference = {}
+    fields = foreign_key_json.get('fields')
+    if fields is None:
+        _error(problems, location, "missing key 'fields'")
+        fields = []
+    elif isinstance(fields, str):
+        fields = [fields]
+    for i, column_name in enumerate(fields):
+        if column_name not in column_names:
+            _error(problems, '%s.fields[%d]' % (location, i),
+                   'column %s does not exist' % column_name)
+    head_key = (reference.get('datapackage'), reference.get('resource'))
+    head_column_names = tables.get(head_key)
+    if reference and head_column_names is None:
+        _error(problems, '%s.reference' % location,
+               'referenced table %s.%s does not exist' % head_key)
+    head_fields = reference.get('fields')
+    if head_fields is None:
+        if reference:
+            _error(problems, '%s.reference' % location,
+                   "missing key 'fields'")
+        head_fields = []
+    elif head_column_names is not None:
+        for i, column_name in enumerate(head_fields):
+            if column_name not in head_column_names:
+                _error(problems,
+                       '%s.reference.fields[%d]' % (location, i),
+                       'referenced column %s.%s.%s does not exist'
+                       % (head_key + (column_name,)))
+    if 'fields' in foreign_key_json and 'fields' in reference:
+        if len(fields) != len(head_fields):
+            _error(problems, location,
+                   '%d columns reference %d columns'
+                   % (len(fields), len(head_fields)))
+        elif not fields:
+            _error(problems, location, 'no columns')
+    for key in ('cardinalitySelf', 'cardinalityRef'):
+        cardinality = reference.get(key)
+        if cardinality and cardinality not in cardinalities:
+            _warning(problems, '%s.reference.%s' % (location, key),
+                     'unknown cardinality %s (known: %s)'
+                     % (cardinality, ', '.join(cardinalities)))
+
+
+class _TableLocation(tuple):
+    """
+    The location of a table, formatted only when needed.
+    """
+
+    def __str__(self):
+        return 'datapackages[%d].resources[%d]' % self
+
+
+def _error(problems, location, message):
+    problems.append(Problem('error', str(location), message))
+
+
+def _warning(problems, location, message):
+    problems.append(Problem('warning', str(location), message))
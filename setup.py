@@ -38,11 +38,22 @@ setup(
         'License :: OSI Approved :: MIT License',
         # Specify the Python versions you support here. In particular, ensure
         # that you indicate whether you support Python 2, Python 3 or both.
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
+    python_requires='>=3.9',
     keywords='ERD entity relationship diagram JTS JSON table schema database tabular data',
     # You can just specify the packages manually here if your project is
     # simple. Or you can use find_packages().
     packages=['jts_erd'],
+    entry_points={
+        'console_scripts': [
+            'jts-erd=jts_erd.cli:main',
+        ],
+    },
     #test_suite = 'tests',
 )